@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""Benchmark miblepy against simulated sensors and an in-process MQTT broker.
+
+Runs the real `Miblepy.go()` / `fetch()` path and the plugin discovery without
+a radio and reports cycle time, messages per second and peak memory. Fetches
+run in the supervised worker processes (`isolate = true`, the default) and
+in-process, the workers get the simulated radio handed over.
+
+    python benchmarks/bench.py --sensors 1,10,100,1000
+    python benchmarks/bench.py --isolate off
+    python benchmarks/bench.py --compare benchmarks/results/0.4.6_20201016-120000.json
+"""
+
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import click
+
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+
+sys.path[:0] = [BENCHMARK_DIR, os.path.dirname(BENCHMARK_DIR)]
+
+import simulation  # noqa: E402 isort:skip
+
+from broker import in_process_broker  # noqa: E402 isort:skip
+
+
+# the simulation has to replace bluepy before miblepy is imported, also in the
+# fetch workers which import this module as their main module
+RADIO = simulation.install()
+
+import miblepy  # noqa: E402 isort:skip
+import miblepy.registry  # noqa: E402 isort:skip
+
+
+SENSOR_TEMPLATES = {
+    "flowercare": "",
+    "lywsd03mmc": "",
+    "bodycompscale": (
+        '[[sensors.bodycompscale.users]]\nuser = "Bench"\nheight = 180\nbirthdate = 1990-01-01\n'
+        'sex = "male"\nweightOver = 70\nweightBelow = 90\n'
+    ),
+}
+
+
+def device_type(index: int) -> str:
+    """Mostly connection based sensors, every tenth one a scale."""
+    if index % 10 == 9:
+        return "bodycompscale"
+
+    return "flowercare" if index % 10 < 5 else "lywsd03mmc"
+
+
+# fetch modes to benchmark by --isolate option
+ISOLATE = {"on": [True], "off": [False], "both": [True, False]}
+
+
+def write_config(directory: str, sensors: int, isolate: bool) -> str:
+    lines = [
+        "[general]",
+        'interface = "hci0"',
+        f"isolate = {str(isolate).lower()}",
+        f'state_dir = "{directory}"',
+        "",
+        "[mqtt]",
+        'server = "localhost"',
+        "port = 1883",
+        'discovery_prefix = "homeassistant"',
+        'prefix = "miblepy"',
+        "",
+    ]
+
+    for index in range(sensors):
+        mac = ":".join(f"{byte:02X}" for byte in index.to_bytes(6, "big"))
+        sensor_type = device_type(index)
+        RADIO.add(mac, sensor_type)
+
+        lines += [f"[[sensors.{sensor_type}]]", f'mac = "{mac}"', f'alias = "Bench {index}"', "fail_silent = true"]
+        lines.append(SENSOR_TEMPLATES[sensor_type])
+
+    config_path = os.path.join(directory, "mible.toml")
+    with open(config_path, "w") as file:
+        file.write("\n".join(lines))
+
+    # for the fetch workers
+    RADIO.share()
+
+    return config_path
+
+
+def run_benchmark(sensors: int, cycles: int, ack_latency: float, isolate: bool) -> Dict[str, Any]:
+    RADIO.devices.clear()
+
+    with tempfile.TemporaryDirectory() as directory, in_process_broker(ack_latency) as broker:
+        config_path = write_config(directory, sensors, isolate)
+        # keep the compiled config out of the real cache
+        miblepy.CONFIG_CACHE_DIR = directory
+
+        # plugin discovery from scratch
+        miblepy.registry._REGISTRY = None  # pylint: disable=protected-access
+        started = time.perf_counter()
+        miblepy.get_plugins()
+        discovery = time.perf_counter() - started
+
+        tracemalloc.start()
+
+        mible = miblepy.Miblepy(config_path)
+        logging.getLogger().setLevel(logging.ERROR)
+
+        results: List[Dict[str, Any]] = []
+
+        for _ in range(cycles):
+            published = broker.published
+
+            started = time.perf_counter()
+            failed = mible.go()
+            duration = time.perf_counter() - started
+
+            messages = broker.published - published
+            results.append(
+                {
+                    "cycle_s": round(duration, 4),
+                    "messages": messages,
+                    "messages_per_s": round(messages / duration, 1) if duration else 0,
+                    "failed": len(failed),
+                }
+            )
+
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        mible.shutdown()
+
+    return {
+        "sensors": sensors,
+        "isolate": isolate,
+        "discovery_s": round(discovery, 4),
+        "peak_memory_kib": round(peak / 1024, 1),
+        "cycles": results,
+    }
+
+
+def compare(results: List[Dict[str, Any]], previous_path: str) -> None:
+    with open(previous_path, "r") as file:
+        # results of older versions were all in-process
+        previous = {
+            (result["sensors"], result.get("isolate", False)): result for result in json.load(file)["results"]
+        }
+
+    click.echo(f"\ncompared to {previous_path}")
+
+    for result in results:
+        if not (before := previous.get((result["sensors"], result["isolate"]))):
+            continue
+
+        for index, (cycle, cycle_before) in enumerate(zip(result["cycles"], before["cycles"]), start=1):
+            change = (cycle["cycle_s"] - cycle_before["cycle_s"]) / cycle_before["cycle_s"] * 100
+            click.echo(
+                f"{result['sensors']:>6} sensors{mode(result)} · cycle {index}: "
+                f"{cycle_before['cycle_s']:.3f}s -> {cycle['cycle_s']:.3f}s ({change:+.1f}%)"
+            )
+
+
+def mode(result: Dict[str, Any]) -> str:
+    return " (isolated)" if result["isolate"] else " (in-process)"
+
+
+@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option("--sensors", default="1,10,100,1000", help="comma separated sensor counts")
+@click.option("--cycles", default=2, type=int, help="cycles per sensor count, the first one announces")
+@click.option("--connect-latency", default=0.5, type=float, help="seconds to connect to a peripheral")
+@click.option("--read-latency", default=0.05, type=float, help="seconds per characteristic read/write")
+@click.option("--failure-rate", default=0.0, type=float, help="probability a connect fails")
+@click.option("--advertisement-rate", default=10.0, type=float, help="advertisements per second and device")
+@click.option("--ack-latency", default=0.05, type=float, help="broker round trip time in seconds")
+@click.option("--time-scale", default=0.01, type=float, help="factor applied to all simulated radio delays")
+@click.option(
+    "--isolate", default="both", type=click.Choice(list(ISOLATE)), help="fetch in worker processes, in-process or both"
+)
+@click.option("--output", default=RESULTS_DIR, type=click.Path(file_okay=False), help="directory for results")
+@click.option("--compare", "previous", type=click.Path(exists=True, dir_okay=False), help="results to compare to")
+def main(
+    sensors: str,
+    cycles: int,
+    connect_latency: float,
+    read_latency: float,
+    failure_rate: float,
+    advertisement_rate: float,
+    ack_latency: float,
+    time_scale: float,
+    isolate: str,
+    output: str,
+    previous: Optional[str],
+) -> None:
+    """benchmark miblepy against simulated sensors"""
+    RADIO.connect_latency = connect_latency
+    RADIO.read_latency = read_latency
+    RADIO.failure_rate = failure_rate
+    RADIO.advertisement_rate = advertisement_rate
+    RADIO.time_scale = time_scale
+
+    results = []
+    for count, isolated in ((int(count), isolated) for count in sensors.split(",") for isolated in ISOLATE[isolate]):
+        result = run_benchmark(count, cycles, ack_latency, isolated)
+        results.append(result)
+
+        for index, cycle in enumerate(result["cycles"], start=1):
+            click.echo(
+                f"{count:>6} sensors{mode(result)} · cycle {index}: {cycle['cycle_s']:.3f}s · "
+                f"{cycle['messages']} messages ({cycle['messages_per_s']}/s) · {cycle['failed']} failed"
+            )
+        click.echo(
+            f"{count:>6} sensors{mode(result)} · plugin discovery {result['discovery_s'] * 1000:.1f}ms · "
+            f"peak memory {result['peak_memory_kib']}KiB"
+        )
+
+    report = {
+        "version": miblepy.__version__,
+        "python": platform.python_version(),
+        "timestamp": datetime.now().isoformat(),
+        "radio": {
+            "connect_latency": connect_latency,
+            "read_latency": read_latency,
+            "failure_rate": failure_rate,
+            "advertisement_rate": advertisement_rate,
+            "ack_latency": ack_latency,
+            "time_scale": time_scale,
+        },
+        "results": results,
+    }
+
+    os.makedirs(output, exist_ok=True)
+    report_path = os.path.join(output, f"{miblepy.__version__}_{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(report_path, "w") as file:
+        json.dump(report, file, indent=2)
+
+    click.echo(f"\nresults stored in {report_path}")
+
+    if previous:
+        compare(results, previous)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""In-process MQTT broker standing in for a real one.
+
+`Client` implements the part of the paho client miblepy uses. Publishes are
+acknowledged after a configurable round trip time by a single ack thread, so
+thousands of in-flight messages behave like on a real network connection.
+"""
+
+import fnmatch
+import heapq
+import threading
+import time
+
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import paho.mqtt.client as mqtt
+
+
+class Broker:
+    """Keeps retained messages, routes subscriptions and acknowledges publishes."""
+
+    def __init__(self, ack_latency: float = 0.0):
+        self.ack_latency = ack_latency
+
+        self.published = 0
+        self.published_bytes = 0
+        self.retained: Dict[str, bytes] = {}
+        self.subscriptions: List[Tuple[str, "Client"]] = []
+
+        self._acks: List[Tuple[float, int, mqtt.MQTTMessageInfo, Optional["Client"]]] = []
+        self._mid = 0
+        self._condition = threading.Condition()
+
+        self._thread = threading.Thread(target=self._acknowledge, name="broker-acks", daemon=True)
+        self._thread.start()
+
+    def _acknowledge(self) -> None:
+        while True:
+            with self._condition:
+                while not self._acks or self._acks[0][0] > time.monotonic():
+                    self._condition.wait(self._acks[0][0] - time.monotonic() if self._acks else None)
+
+                _, _, info, client = heapq.heappop(self._acks)
+
+            with info._condition:  # pylint: disable=protected-access
+                info._published = True  # pylint: disable=protected-access
+                info._condition.notify()  # pylint: disable=protected-access
+
+            if client and client.on_publish:
+                client.on_publish(client, None, info.mid)
+
+    def publish(
+        self, topic: str, payload: bytes, retain: bool, client: Optional["Client"] = None
+    ) -> mqtt.MQTTMessageInfo:
+        with self._condition:
+            self._mid += 1
+            info = mqtt.MQTTMessageInfo(self._mid)
+            info.rc = mqtt.MQTT_ERR_SUCCESS
+
+            self.published += 1
+            self.published_bytes += len(payload)
+
+            # an empty retained message deletes the retained message of the topic
+            if retain and payload:
+                self.retained[topic] = payload
+            elif retain:
+                self.retained.pop(topic, None)
+
+            heapq.heappush(self._acks, (time.monotonic() + self.ack_latency, self._mid, info, client))
+            self._condition.notify()
+
+        for pattern, client in list(self.subscriptions):
+            if topic_matches(pattern, topic):
+                client.deliver(topic, payload, retain=False)
+
+        return info
+
+    def subscribe(self, pattern: str, client: "Client") -> None:
+        self.subscriptions.append((pattern, client))
+
+        for topic, payload in list(self.retained.items()):
+            if topic_matches(pattern, topic):
+                client.deliver(topic, payload, retain=True)
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """MQTT wildcard matching."""
+    return fnmatch.fnmatchcase(topic, pattern.replace("+", "[!/]*").replace("#", "*"))
+
+
+class Message:
+    def __init__(self, topic: str, payload: bytes, retain: bool):
+        self.topic = topic
+        self.payload = payload
+        self.retain = retain
+        self.qos = 1
+
+
+class Client:
+    """Minimal paho client talking to the in-process broker."""
+
+    # set by in_process_broker()
+    broker: Broker
+
+    def __init__(self, client_id: Optional[str] = None, *args: Any, **kwargs: Any):
+        self.client_id = client_id
+        self.on_connect: Optional[Callable[..., None]] = None
+        self.on_disconnect: Optional[Callable[..., None]] = None
+        self.on_message: Optional[Callable[..., None]] = None
+        self.on_publish: Optional[Callable[..., None]] = None
+        self.connected = False
+
+    def username_pw_set(self, username: str, password: Optional[str] = None) -> None:
+        pass
+
+    def tls_set(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def max_inflight_messages_set(self, inflight: int) -> None:
+        pass
+
+    def will_set(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def connect(self, host: str, port: int = 1883, keepalive: int = 60) -> int:
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def loop_start(self) -> None:
+        self.connected = True
+        if self.on_connect:
+            self.on_connect(self, None, {}, 0)
+
+    def loop_stop(self, force: bool = False) -> None:
+        pass
+
+    def disconnect(self) -> None:
+        self.connected = False
+        if self.on_disconnect:
+            self.on_disconnect(self, None, 0)
+
+    def publish(self, topic: str, payload: Any = None, qos: int = 0, retain: bool = False) -> mqtt.MQTTMessageInfo:
+        if isinstance(payload, str):
+            payload = payload.encode()
+        return self.broker.publish(topic, payload or b"", retain, self)
+
+    def subscribe(self, topic: str, qos: int = 0) -> Tuple[int, int]:
+        self.broker.subscribe(topic, self)
+        return mqtt.MQTT_ERR_SUCCESS, 0
+
+    def deliver(self, topic: str, payload: bytes, retain: bool) -> None:
+        if self.connected and self.on_message:
+            self.on_message(self, None, Message(topic, payload, retain))
+
+
+@contextmanager
+def in_process_broker(ack_latency: float = 0.0) -> Iterator[Broker]:
+    """Route all paho clients to a fresh in-process broker."""
+    original = mqtt.Client
+    broker = Client.broker = Broker(ack_latency)
+
+    setattr(mqtt, "Client", Client)
+
+    try:
+        yield broker
+    finally:
+        setattr(mqtt, "Client", original)
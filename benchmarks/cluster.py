@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Run two cluster hosts against the in-process MQTT broker and check their leases.
+
+Both hosts share the same sensors and never tick from their main thread, like a
+daemon stuck in a fetch cycle longer than the lease time, only the renewal
+thread keeps the leases alive. Reports sensors held by no or by both hosts and
+how long the remaining host takes to pick up the sensors of one leaving cleanly
+and of one crashing.
+
+    python benchmarks/cluster.py
+    python benchmarks/cluster.py --sensors 100 --lease-ttl 2 --cycle 10
+"""
+
+import os
+import sys
+import time
+
+from typing import Any, Dict, List, Tuple
+
+import click
+
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+sys.path[:0] = [BENCHMARK_DIR, os.path.dirname(BENCHMARK_DIR)]
+
+from broker import Client, in_process_broker  # noqa: E402 isort:skip
+
+from miblepy import DeviceConfig  # noqa: E402 isort:skip
+from miblepy.cluster import Coordinator  # noqa: E402 isort:skip
+
+
+TOPIC = "bench/cluster"
+
+# seconds between two looks at the leases
+SAMPLE = 0.05
+
+
+def sensors(count: int) -> List[DeviceConfig]:
+    macs = (f"C4:7C:8D:00:{index // 256:02X}:{index % 256:02X}" for index in range(count))
+    return [DeviceConfig({"mac": mac}, "flowercare") for mac in macs]
+
+
+def host(name: str, devices: List[DeviceConfig], lease_ttl: float, settle: float) -> Coordinator:
+    """Coordinator connected to the broker with a client of its own, like a miblepy daemon."""
+    client = Client(name)
+
+    def publish(topic: str, payload: str) -> None:
+        client.publish(topic, payload, qos=1, retain=True)
+
+    coordinator = Coordinator(name, TOPIC, devices, publish, lease_ttl=lease_ttl, settle=settle)
+
+    def on_message(_: Any, __: Any, message: Any) -> None:
+        coordinator.handle(message.topic, message.payload)
+
+    client.on_message = on_message
+    client.loop_start()
+
+    for topic in coordinator.subscriptions:
+        client.subscribe(topic)
+
+    return coordinator
+
+
+def watch(hosts: List[Coordinator], macs: List[str], seconds: float) -> Tuple[int, int, Dict[str, int]]:
+    """Sensors held by no host and by several hosts, summed over the samples, and the sensors per host at the end."""
+    orphaned = doubled = 0
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        owned = [coordinator.owned_macs() for coordinator in hosts]
+
+        for mac in macs:
+            holders = sum(mac in macs_of_host for macs_of_host in owned)
+            orphaned += holders == 0
+            doubled += holders > 1
+
+        time.sleep(SAMPLE)
+
+    return orphaned, doubled, {coordinator.host: len(coordinator.owned_macs()) for coordinator in hosts}
+
+
+def takeover(coordinator: Coordinator, macs: List[str], timeout: float) -> float:
+    """Seconds until a host holds all sensors, the timeout if it does not."""
+    started = time.monotonic()
+
+    while len(coordinator.owned_macs()) < len(macs) and time.monotonic() - started < timeout:
+        time.sleep(SAMPLE)
+
+    return time.monotonic() - started
+
+
+@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option("--sensors", "count", default=20, type=int, help="sensors configured on both hosts")
+@click.option("--lease-ttl", default=3.0, type=float, help="seconds a lease is valid without being renewed")
+@click.option("--settle", default=0.5, type=float, help="seconds to collect the messages of the other host")
+@click.option("--cycle", default=10.0, type=float, help="seconds both hosts are busy without ticking")
+def main(count: int, lease_ttl: float, settle: float, cycle: float) -> None:
+    devices = sensors(count)
+    macs = [device.short_mac for device in devices]
+    failures: List[str] = []
+
+    with in_process_broker() as broker:
+        first, second = host("host-a", devices, lease_ttl, settle), host("host-b", devices, lease_ttl, settle)
+        first.join()
+        second.join()
+
+        # let both hosts claim their share before counting
+        watch([first, second], macs, lease_ttl / 3 + settle)
+        orphaned, doubled, shares = watch([first, second], macs, cycle)
+        click.echo(
+            f"busy for {cycle:.1f}s ({cycle / lease_ttl:.1f} lease times): {orphaned} orphaned and {doubled} "
+            f"doubled sensor samples, shares {shares}, {broker.published} messages"
+        )
+        if orphaned or doubled or min(shares.values()) == 0:
+            failures.append("leases were not kept while the hosts were busy")
+
+        second.release()
+        released = takeover(first, macs, 2 * lease_ttl)
+        click.echo(f"host-b released its leases, host-a holds all sensors after {released:.2f}s")
+
+        # a host coming back and crashing, its leases expire instead of being released
+        second = host("host-b", devices, lease_ttl, settle)
+        second.join()
+        watch([first, second], macs, lease_ttl / 3 + settle)
+        second.stop()
+        crashed = takeover(first, macs, 3 * lease_ttl)
+        click.echo(f"host-b crashed, host-a holds all sensors after {crashed:.2f}s (lease time {lease_ttl:.1f}s)")
+
+        if released >= 2 * lease_ttl or crashed >= 3 * lease_ttl:
+            failures.append("host-a did not take over the sensors of host-b")
+
+        first.release()
+
+    for failure in failures:
+        click.echo(f"FAIL {failure}", err=True)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Check the import time budget of the `mible` command line.
+
+Imports the cli in a fresh interpreter with `python -X importtime` and fails if
+it takes too long, loads too many modules or pulls in the mqtt/bluetooth stack
+which only the fetching commands need.
+
+    python benchmarks/importtime.py
+    python benchmarks/importtime.py --max-ms 300 --runs 5
+"""
+
+import os
+import subprocess  # nosec
+import sys
+
+from typing import Dict, List, Tuple
+
+import click
+
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# imported by `mible --version` and `mible plugins`
+TARGET = "miblepy.mible.cli"
+
+# top level packages `import miblepy.mible.cli` must not load
+FORBIDDEN = ("paho", "bluepy", "tomlkit", "cryptography", "numpy", "http.server", "multiprocessing")
+
+MAX_MS = 200.0
+MAX_MODULES = 150
+
+
+def measure(target: str) -> Tuple[float, Dict[str, float]]:
+    """Cumulative import time of target in ms and the self time of every module loaded."""
+    result = subprocess.run(  # nosec
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(BENCHMARK_DIR),
+        check=True,
+    )
+
+    modules: Dict[str, float] = {}
+    total = 0.0
+
+    # import time: self [us] | cumulative | imported package
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+
+        own, cumulative, name = (field.strip() for field in line[len("import time:") :].split("|"))
+        modules[name] = int(own) / 1000
+
+        if name == target:
+            total = int(cumulative) / 1000
+
+    return total, modules
+
+
+def is_forbidden(name: str) -> bool:
+    return any(name == package or name.startswith(f"{package}.") for package in FORBIDDEN)
+
+
+@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option("--max-ms", default=MAX_MS, type=float, help="budget for the cumulative import time")
+@click.option("--max-modules", default=MAX_MODULES, type=int, help="budget for the number of modules loaded")
+@click.option("--runs", default=3, type=int, help="imports to measure, the fastest one counts")
+@click.option("--top", default=10, type=int, help="slowest modules to show")
+def main(max_ms: float, max_modules: int, runs: int, top: int) -> None:
+    """check the import time and module count budget of the mible cli"""
+    measurements = [measure(TARGET) for _ in range(max(runs, 1))]
+    total, modules = min(measurements, key=lambda measurement: measurement[0])
+
+    click.echo(f"import {TARGET}: {total:.1f} ms, {len(modules)} modules (budget {max_ms:.0f} ms, {max_modules})")
+
+    for name, own in sorted(modules.items(), key=lambda item: item[1], reverse=True)[:top]:
+        click.echo(f"  {own:8.2f} ms  {name}")
+
+    failures: List[str] = []
+
+    if total > max_ms:
+        failures.append(f"import took {total:.1f} ms, budget is {max_ms:.0f} ms")
+
+    if len(modules) > max_modules:
+        failures.append(f"{len(modules)} modules loaded, budget is {max_modules}")
+
+    if forbidden := sorted(name for name in modules if is_forbidden(name)):
+        failures.append(f"modules only the fetching commands need were loaded: {', '.join(forbidden)}")
+
+    for failure in failures:
+        click.echo(f"FAIL {failure}", err=True)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""Simulated bluetooth devices standing in for bluepy.
+
+`install()` replaces the `bluepy.btle` module before miblepy and its plugins
+are imported, so the unmodified plugins talk to simulated peripherals and
+scanners with configurable latency, failure rate and advertisement rate.
+
+Worker processes started after `Radio.share()` install the same simulated
+devices, as long as their main module calls `install()` on import like the
+benchmark does.
+"""
+
+import json
+import os
+import random
+import struct
+import sys
+import time
+import types
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class BTLEException(Exception):
+    def __init__(self, message: str, resp_dict: Optional[Dict[str, Any]] = None):
+        self.message = message
+        self.resp_dict = resp_dict
+        super().__init__(message)
+
+
+class BTLEDisconnectError(BTLEException):
+    pass
+
+
+class BTLEManagementError(BTLEException):
+    pass
+
+
+class DefaultDelegate:
+    def __init__(self) -> None:
+        pass
+
+    def handleNotification(self, cHandle: int, data: bytes) -> None:
+        pass
+
+    def handleDiscovery(self, scanEntry: Any, isNewDev: bool, isNewData: bool) -> None:
+        pass
+
+
+# environment variable handing the radio to the fetch worker processes
+ENVIRONMENT = "MIBLEPY_SIMULATION"
+
+SETTINGS = ("connect_latency", "read_latency", "failure_rate", "advertisement_rate", "time_scale")
+
+
+class Radio:
+    """The simulated air: devices by mac and how they behave."""
+
+    def __init__(
+        self,
+        connect_latency: float = 0.5,
+        read_latency: float = 0.05,
+        failure_rate: float = 0.0,
+        advertisement_rate: float = 10.0,
+        time_scale: float = 1.0,
+        seed: int = 0,
+    ):
+        self.connect_latency = connect_latency
+        self.read_latency = read_latency
+        self.failure_rate = failure_rate
+        self.advertisement_rate = advertisement_rate
+        self.time_scale = time_scale
+        self.random = random.Random(seed)
+
+        # lowercase mac -> device type
+        self.devices: Dict[str, str] = {}
+
+    def add(self, mac: str, device_type: str) -> None:
+        self.devices[mac.lower()] = device_type
+
+    def share(self) -> None:
+        """Hand the devices and settings to the processes started from now on."""
+        os.environ[ENVIRONMENT] = json.dumps(
+            {"devices": self.devices, **{setting: getattr(self, setting) for setting in SETTINGS}}
+        )
+
+    @classmethod
+    def shared(cls) -> Optional["Radio"]:
+        """The radio shared by the parent process, if any."""
+        if not (shared := os.environ.get(ENVIRONMENT)):
+            return None
+
+        state = json.loads(shared)
+        radio = cls(**{setting: state[setting] for setting in SETTINGS})
+        radio.devices = state["devices"]
+
+        return radio
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def fails(self) -> bool:
+        return self.random.random() < self.failure_rate
+
+
+RADIO = Radio()
+
+
+def flowercare_characteristics() -> Dict[int, bytes]:
+    temperature = RADIO.random.randint(150, 250)
+    return {
+        0x38: bytes([RADIO.random.randint(10, 100), 0x00]) + b"3.2.2",
+        0x35: struct.pack("<HBIBH", temperature, 0, RADIO.random.randint(0, 20000), RADIO.random.randint(10, 60), 350)
+        + bytes(6),
+    }
+
+
+def lywsd03mmc_notification() -> bytes:
+    return struct.pack("<hBH", RADIO.random.randint(1800, 2600), RADIO.random.randint(30, 70), 2950)
+
+
+def bodycompscale_service_data() -> str:
+    now = datetime.now()
+    control = (1 << 5) | (1 << 1)
+    weight = int(RADIO.random.uniform(72, 88) * 100 * 2)
+    data = struct.pack(
+        "<2sBBHBBBBBHH", b"\x1b\x18", 2, control, now.year, now.month, now.day, now.hour, now.minute, now.second,
+        RADIO.random.randint(400, 600), weight,
+    )
+    return data.hex()
+
+
+def lywsd03mmcadv_service_data() -> str:
+    # pvvx custom firmware format
+    data = struct.pack(
+        "<2s6shHHBBB", b"\x1a\x18", bytes(6), RADIO.random.randint(1800, 2600), RADIO.random.randint(3000, 7000),
+        2950, 80, RADIO.random.randint(0, 255), 0,
+    )
+    return data.hex()
+
+
+# service data of the devices which advertise their measurements
+ADVERTISEMENTS = {"bodycompscale": bodycompscale_service_data, "lywsd03mmcadv": lywsd03mmcadv_service_data}
+
+
+class Peripheral:
+    def __init__(self, deviceAddr: Optional[str] = None, addrType: str = "public", iface: Optional[int] = None):
+        self.addr = (deviceAddr or "").lower()
+        self.iface = iface
+        self.delegate: Optional[DefaultDelegate] = None
+
+        RADIO.sleep(RADIO.connect_latency)
+
+        if self.addr not in RADIO.devices or RADIO.fails():
+            raise BTLEDisconnectError(f"Failed to connect to peripheral {deviceAddr}")
+
+        self.device_type = RADIO.devices[self.addr]
+        self.characteristics = flowercare_characteristics() if self.device_type == "flowercare" else {}
+
+    def setDelegate(self, delegate: DefaultDelegate) -> "Peripheral":
+        self.delegate = delegate
+        return self
+
+    def withDelegate(self, delegate: DefaultDelegate) -> "Peripheral":
+        return self.setDelegate(delegate)
+
+    def writeCharacteristic(self, handle: int, val: bytes, withResponse: bool = False) -> Dict[str, Any]:
+        RADIO.sleep(RADIO.read_latency)
+        return {}
+
+    def readCharacteristic(self, handle: int) -> bytes:
+        RADIO.sleep(RADIO.read_latency)
+        return self.characteristics.get(handle, bytes(16))
+
+    def waitForNotifications(self, timeout: float) -> bool:
+        RADIO.sleep(min(RADIO.read_latency * 10, timeout))
+
+        if self.device_type == "lywsd03mmc" and self.delegate:
+            self.delegate.handleNotification(0x36, lywsd03mmc_notification())
+            return True
+
+        return False
+
+    def disconnect(self) -> None:
+        pass
+
+
+class ScanEntry:
+    def __init__(self, addr: str, scan_data: List[Tuple[int, str, str]], rssi: int = -70):
+        self.addr = addr
+        self.rssi = rssi
+        self.scan_data = scan_data
+
+    def getScanData(self) -> List[Tuple[int, str, str]]:
+        return self.scan_data
+
+
+class Scanner:
+    def __init__(self, iface: int = 0):
+        self.iface = iface
+        self.delegate: Optional[DefaultDelegate] = None
+        self.seen: Dict[str, ScanEntry] = {}
+
+    def withDelegate(self, delegate: DefaultDelegate) -> "Scanner":
+        self.delegate = delegate
+        return self
+
+    def clear(self) -> None:
+        self.seen = {}
+
+    def start(self, passive: bool = False) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def process(self, timeout: float = 10) -> None:
+        """Deliver advertisements of the broadcasting devices for the scan window."""
+        advertising = [mac for mac, device_type in RADIO.devices.items() if device_type in ADVERTISEMENTS]
+        advertisements = int(timeout * RADIO.advertisement_rate * len(advertising))
+
+        for _ in range(advertisements):
+            mac = RADIO.random.choice(advertising)
+            new_dev = mac not in self.seen
+            entry = self.seen.setdefault(mac, ScanEntry(mac, [], rssi=RADIO.random.randint(-95, -40)))
+            entry.scan_data = [(22, "16b Service Data", ADVERTISEMENTS[RADIO.devices[mac]]())]
+
+            if self.delegate:
+                self.delegate.handleDiscovery(entry, new_dev, True)
+
+        RADIO.sleep(timeout)
+
+    def getDevices(self) -> List[ScanEntry]:
+        return list(self.seen.values())
+
+    def scan(self, timeout: float = 10, passive: bool = False) -> List[ScanEntry]:
+        self.clear()
+        self.start(passive=passive)
+        self.process(timeout)
+        self.stop()
+
+        return self.getDevices()
+
+
+def install(radio: Optional[Radio] = None) -> Radio:
+    """Replace bluepy with the simulation, must run before miblepy is imported."""
+    global RADIO  # pylint: disable=global-statement
+
+    if radio := radio or Radio.shared():
+        RADIO = radio
+
+    btle = types.ModuleType("bluepy.btle")
+    for name in (
+        "BTLEException",
+        "BTLEDisconnectError",
+        "BTLEManagementError",
+        "DefaultDelegate",
+        "Peripheral",
+        "ScanEntry",
+        "Scanner",
+    ):
+        setattr(btle, name, globals()[name])
+
+    bluepy = types.ModuleType("bluepy")
+    bluepy.btle = btle  # type: ignore
+
+    sys.modules["bluepy"] = bluepy
+    sys.modules["bluepy.btle"] = btle
+
+    return RADIO
@@ -1,33 +1,66 @@
 __version__ = "0.4.6"
 
-import importlib
-import inspect
+import copy
+import hashlib
 import json
 import logging
 import os
-import pkgutil
+import pickle  # nosec
+import signal
+import socket
+import threading
 import time
 
-from datetime import datetime
+from collections import deque
+from datetime import date, datetime
 from enum import Enum
-from random import shuffle
-from typing import Any, Dict, List, Optional, Set, Union
+from functools import partial
+from heapq import heapify, heappop, heappush
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Iterable, List, Mapping, Optional, Set, Tuple, Union
 
-import paho.mqtt.client as mqtt
+from miblepy import metrics
+from miblepy.changes import MAX_SILENCE, ChangeFilter, Deadband, parse_deadbands
+from miblepy.cluster import LEASE_TTL, SETTLE, Coordinator
+from miblepy.deviceplugin import MibleAdvertisementPlugin, MibleDevicePlugin, MibleStreamingPlugin
+from miblepy.payload import PACKAGES, check_format, encode
+from miblepy.registry import get_registry
+from miblepy.scheduler import AdapterScheduler
+from miblepy.state import STATE_DIR, JsonStore
+from miblepy.stats import SensorStats
+from miblepy.streamer import NotificationStreamer
 
-from tomlkit import parse
-from tomlkit.toml_document import TOMLDocument
 
-from bluepy import btle
-from miblepy.deviceplugin import MibleDevicePlugin
+# the mqtt and bluetooth stacks are imported on first use, `mible --version` or `mible plugins` do not need them
+if TYPE_CHECKING:  # pragma: no cover
+    import paho.mqtt.client as mqtt
+
+    from miblepy.supervisor import FetchWorker
 
 
 DEVICE_PREFIX = "miblepy_"
 
 MAX_RETRIES = 3
 INITIAL_TIMEOUT = 1
+BREAKER_THRESHOLD = 10
+BREAKER_COOLOFF = 30 * 60
+INTERVAL = 240
+MAX_INFLIGHT = 100
+PUBLISH_TIMEOUT = 30
+CONNECT_TIMEOUT = 30
+DISCOVERY_REFRESH = 24 * 60 * 60
+HISTORY_BATCH = 100
+MAX_STREAMS = 4
+RSSI_SCAN = 5
+RSSI_HYSTERESIS = 6
 CONFIG_FILE = "~/.mible.toml"
 
+# bump if compile_config() changes its output, cached configs of an older format are compiled again
+COMPILED_FORMAT = 9
+
+# compiled configs are looked up before the state_dir of the config is known, so they always live here
+CONFIG_CACHE_DIR = STATE_DIR
+
 
 class ATTRS(Enum):
     """Attributes sent in the json dict."""
@@ -97,22 +130,70 @@ def hl(text: Union[int, float, str]) -> str:
     return f"\033[1m{text}\033[0m"
 
 
+def unwrap(value: Any) -> Any:
+    """Convert parsed toml items to plain python types (which can be pickled)."""
+    if isinstance(value, dict):
+        return {str(key): unwrap(item) for key, item in value.items()}
+
+    if isinstance(value, list):
+        return [unwrap(item) for item in value]
+
+    for plain_type in (bool, int, float, str):
+        if isinstance(value, plain_type):
+            return plain_type(value)
+
+    if isinstance(value, datetime):
+        return datetime(
+            value.year, value.month, value.day, value.hour, value.minute, value.second, value.microsecond, value.tzinfo
+        )
+
+    if isinstance(value, date):
+        return date(value.year, value.month, value.day)
+
+    return value
+
+
 # pylint: disable-msg=too-many-instance-attributes
 class Configuration:
     """Stores the program configuration."""
 
+    # compiled from the config file
+    debug: bool
+    logfile: Optional[str]
+    interfaces: List[str]
+    interface: str
+    max_retries: int
+    breaker_threshold: int
+    breaker_cooloff: float
+    isolate: bool
+    state_dir: str
+    metrics_port: int
+    metrics_address: str
+    interval: int
+    rssi_scan: float
+    rssi_hysteresis: float
+    max_streams: int
+    publish_on_change: bool
+    deadband: Dict[str, Any]
+    max_silence: float
+    sensors: List["DeviceConfig"]
+    mqtt: Dict[str, Any]
+    cluster: Dict[str, Any]
+
     def __init__(self, config_file_path: str, verbose: bool = False, debug: bool = False):
+        self.path = os.path.abspath(os.path.expanduser(config_file_path))
 
-        with open(config_file_path, "r") as file:
-            config_file = parse(file.read())
+        # the parsed and validated config file, re-parsed only if the file changed. its warnings are logged
+        # once logging is set up
+        compiled, messages = load_compiled(self.path)
+        for key, value in compiled.items():
+            setattr(self, key, value)
 
-        self.config_file: TOMLDocument = config_file
         self.config: Dict[str, Any] = {}
 
-        config_general = config_file.get("general")
-
         # debug
-        self.debug = debug or config_general.get("debug", False)
+        self.debug = debug or self.debug
+        self.loglevel: int
         if self.debug:
             self.loglevel = logging.DEBUG
         elif verbose:
@@ -124,76 +205,375 @@ class Configuration:
         timeform = "%Y-%m-%d %H:%M:%S"
         logform = "{asctime} {levelname} {message}"
 
-        if logfile := config_general.get("logfile"):
+        if self.logfile:
             logging.basicConfig(
-                level=logging.INFO, filename=logfile, datefmt=timeform, format=logform, style="{",
+                level=logging.INFO, filename=self.logfile, datefmt=timeform, format=logform, style="{",
             )
         else:
             logging.basicConfig(level=logging.INFO, datefmt=timeform, format=logform, style="{")
 
-        # ble interface
-        self.interface: str = config_general.get("interface", "hci0")
-        self.max_retries: int = config_general.get("max_retries", MAX_RETRIES)
+        for level, message in messages:
+            logging.log(level, message)
 
-        #  mqtt
-        mqtt_settings: Dict[str, Any] = {}
-        config_mqtt = config_file.get("mqtt")
-        if "server" not in config_mqtt:
-            logging.error("no mqtt server")
-        else:
-            mqtt_settings["server"] = config_mqtt.get("server")
-            mqtt_settings["port"] = config_mqtt.get("port", 8883)
-            mqtt_settings["client_id"] = config_mqtt.get("client_id")
-            mqtt_settings["user"] = config_mqtt.get("username")
-            mqtt_settings["password"] = config_mqtt.get("password")
-            mqtt_settings["discovery_prefix"] = config_mqtt.get("discovery_prefix")
-            mqtt_settings["prefix"] = config_mqtt.get("prefix", "miblepy/")
-            mqtt_settings["trailing_slash"] = config_mqtt.get("trailing_slash", False)
-            mqtt_settings["timestamp_format"] = config_mqtt.get("timestamp_format")
-            mqtt_settings["ca_cert"] = config_mqtt.get("ca_cert")
-
-        # sensors
-        if "sensors" not in config_file:
-            logging.error("no mqtt server")
-        else:
-            sensors: List[DeviceConfig] = []
+    def __str__(self) -> str:
+        with open(self.path, "r") as file:
+            return file.read()
+
+
+def compile_config(content: str) -> Dict[str, Any]:
+    """Parse and validate a config file into the attributes of a Configuration."""
+    from tomlkit import parse
+
+    config_file = unwrap(parse(content))
+    config_general = config_file.get("general") or {}
+    compiled: Dict[str, Any] = {}
+
+    compiled["debug"] = config_general.get("debug", False)
+    compiled["logfile"] = config_general.get("logfile")
+
+    # ble interface(s), sensors are fetched in parallel if there are multiple adapters
+    interfaces = config_general.get("interface", "hci0")
+    compiled["interfaces"] = [interfaces] if isinstance(interfaces, str) else list(interfaces)
+    compiled["interface"] = compiled["interfaces"][0]
+    compiled["max_retries"] = config_general.get("max_retries", MAX_RETRIES)
+
+    # park sensors after this many failed fetches in a row for the cool-off (seconds), 0 disables
+    compiled["breaker_threshold"] = config_general.get("breaker_threshold", BREAKER_THRESHOLD)
+    compiled["breaker_cooloff"] = config_general.get("breaker_cooloff", BREAKER_COOLOFF)
+
+    # run plugin fetches in supervised worker processes which are killed if they hang
+    compiled["isolate"] = config_general.get("isolate", True)
+
+    # directory to keep state between runs
+    compiled["state_dir"] = os.path.expanduser(config_general.get("state_dir", STATE_DIR))
+
+    # prometheus text endpoint, 0 disables it
+    compiled["metrics_port"] = config_general.get("metrics_port", 0)
+    compiled["metrics_address"] = config_general.get("metrics_address", "127.0.0.1")
+
+    # default polling interval in seconds (daemon mode)
+    compiled["interval"] = config_general.get("interval", INTERVAL)
+
+    # with several adapters, seconds to listen for the signal strength of the connection based sensors if
+    # there is no scan window for advertisements anyway, 0 disables routing them to the adapter hearing them best
+    compiled["rssi_scan"] = config_general.get("rssi_scan", RSSI_SCAN)
+    # dB another adapter (or host) has to hear a sensor better to take it over
+    compiled["rssi_hysteresis"] = config_general.get("rssi_hysteresis", RSSI_HYSTERESIS)
+
+    # connections kept open per adapter for sensors with `stream = true` (daemon mode)
+    compiled["max_streams"] = config_general.get("max_streams", MAX_STREAMS)
+
+    # publish the state of the sensors only if it changed, defaults for the sensor settings of the same name
+    compiled["publish_on_change"] = config_general.get("publish_on_change", False)
+    compiled["deadband"] = config_general.get("deadband", {})
+    compiled["max_silence"] = config_general.get("max_silence", MAX_SILENCE)
+
+    #  mqtt
+    mqtt_settings: Dict[str, Any] = {}
+    config_mqtt = config_file.get("mqtt") or {}
+    if "server" not in config_mqtt:
+        logging.error("no mqtt server")
+    else:
+        mqtt_settings["server"] = config_mqtt.get("server")
+        mqtt_settings["port"] = config_mqtt.get("port", 8883)
+        mqtt_settings["client_id"] = config_mqtt.get("client_id")
+        mqtt_settings["user"] = config_mqtt.get("username")
+        mqtt_settings["password"] = config_mqtt.get("password")
+        mqtt_settings["discovery_prefix"] = config_mqtt.get("discovery_prefix")
+        mqtt_settings["discovery_refresh"] = config_mqtt.get("discovery_refresh", DISCOVERY_REFRESH)
+        mqtt_settings["prefix"] = config_mqtt.get("prefix", "miblepy/")
+        mqtt_settings["trailing_slash"] = config_mqtt.get("trailing_slash", False)
+        mqtt_settings["timestamp_format"] = config_mqtt.get("timestamp_format")
+        mqtt_settings["payload_format"] = config_mqtt.get("payload_format", "json")
+        mqtt_settings["ca_cert"] = config_mqtt.get("ca_cert")
+        mqtt_settings["max_inflight"] = config_mqtt.get("max_inflight", MAX_INFLIGHT)
+        mqtt_settings["publish_timeout"] = config_mqtt.get("publish_timeout", PUBLISH_TIMEOUT)
+        mqtt_settings["metrics_topic"] = config_mqtt.get("metrics_topic")
+        mqtt_settings["reload_topic"] = config_mqtt.get("reload_topic")
+
+    # sensors
+    sensors: List[DeviceConfig] = []
+
+    if "sensors" not in config_file:
+        logging.error("no sensors configured")
+
+    for device_type, device_sensors in config_file.get("sensors", {}).items():
+        for sensor in device_sensors:
+            if "mac" not in sensor:
+                logging.error(f"mac of {device_type} sensor {sensor.get('alias', '')} must not be None, skipping it")
+                continue
+
+            sensors.append(
+                DeviceConfig(
+                    sensor,
+                    device_type,
+                    "fail_silent" in sensor,
+                    interval=compiled["interval"],
+                    prefix=mqtt_settings.get("prefix", ""),
+                    trailing_slash=mqtt_settings.get("trailing_slash", False),
+                    on_change=compiled["publish_on_change"],
+                    deadband=compiled["deadband"],
+                    max_silence=compiled["max_silence"],
+                    payload_format=mqtt_settings.get("payload_format", "json"),
+                )
+            )
 
-            for device_type in config_file.get("sensors", {}):
-                for sensor in config_file["sensors"][device_type]:
-                    fail_silent = "fail_silent" in sensor
-                    sensors.append(DeviceConfig(sensor, device_type, fail_silent))
+    # home assistant reads the state of the discovered entities with json value templates
+    if binary := [sensor.name for sensor in sensors if sensor.payload_format in PACKAGES]:
+        logging.warning(
+            f"home assistant can not decode the binary states of {', '.join(binary)}, their discovered entities "
+            f"stay unknown. use json for sensors shown in home assistant"
+        )
 
-        self.sensors = sensors
-        self.mqtt = mqtt_settings
+    # share the sensors with other hosts through leases on the broker, only if configured
+    cluster: Dict[str, Any] = {}
+    if (config_cluster := config_file.get("cluster")) is not None:
+        cluster["host"] = config_cluster.get("host")
+        cluster["topic"] = config_cluster.get("topic") or f"{mqtt_settings.get('prefix', '').rstrip('/')}/cluster"
+        cluster["lease_ttl"] = config_cluster.get("lease_ttl", LEASE_TTL)
+        cluster["settle"] = config_cluster.get("settle", SETTLE)
 
-    def __str__(self) -> str:
-        return str(self.config_file.as_string())
+    compiled["sensors"] = sensors
+    compiled["mqtt"] = mqtt_settings
+    compiled["cluster"] = cluster
 
+    return compiled
 
-class DeviceConfig:
-    """Stores the configuration of a sensor."""
 
-    def __init__(self, config: Dict[str, Any], device_type: str, fail_silent: bool = False):
-        if "mac" not in config:
-            logging.exception("mac of sensor must not be None")
+def localize(compiled: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve the settings of a compiled config which depend on this host, they are not cached."""
+    # the binary payload formats need their package installed
+    formats: Dict[str, str] = {}
+
+    def resolve(payload_format: Any) -> str:
+        if payload_format not in formats:
+            formats[payload_format] = check_format(payload_format)
+        return formats[payload_format]
+
+    if "payload_format" in compiled["mqtt"]:
+        compiled["mqtt"]["payload_format"] = resolve(compiled["mqtt"]["payload_format"])
+
+    compiled["sensors"] = [
+        sensor.replace(payload_format=resolve(sensor.payload_format)) for sensor in compiled["sensors"]
+    ]
+
+    if compiled["cluster"]:
+        compiled["cluster"]["host"] = compiled["cluster"]["host"] or socket.gethostname()
+
+    return compiled
+
+
+class LogRecorder(logging.Filter):
+    """Holds back the messages logged by the current thread, e.g. until logging is set up."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.thread = threading.get_ident()
+        self.records: List[Tuple[int, str]] = []
+        self.handler: Optional[logging.Handler] = None
+
+    def __enter__(self) -> "LogRecorder":
+        root = logging.getLogger()
+
+        # without a handler the first message sets up a default one and a later basicConfig() does nothing
+        if not root.handlers:
+            self.handler = logging.NullHandler()
+            root.addHandler(self.handler)
+
+        root.addFilter(self)
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        root = logging.getLogger()
+        root.removeFilter(self)
+
+        if self.handler:
+            root.removeHandler(self.handler)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.thread != self.thread:
+            return True
+
+        self.records.append((record.levelno, record.getMessage()))
+        return False
+
+
+def load_compiled(path: str) -> Tuple[Dict[str, Any], List[Tuple[int, str]]]:
+    """Compiled config file and the messages logged while loading it, to be logged by the caller.
+
+    The compiled config is taken from the cache if the file did not change since it was compiled, the warnings
+    of compiling it are cached along.
+    """
+    with LogRecorder() as recorder:
+        compiled = _load_compiled(path, recorder)
+        localize(compiled)
+
+    return compiled, recorder.records
+
+
+def _load_compiled(path: str, recorder: LogRecorder) -> Dict[str, Any]:
+    cache_path = os.path.join(
+        os.path.expanduser(CONFIG_CACHE_DIR), f"config_{hashlib.sha1(path.encode()).hexdigest()[:12]}.pickle"  # nosec
+    )
+    stat = os.stat(path)
+    cached: Dict[str, Any]
+
+    try:
+        with open(cache_path, "rb") as file:
+            cached = pickle.load(file)  # nosec
+
+        unchanged = (cached["mtime"], cached["size"]) == (stat.st_mtime_ns, stat.st_size)
+        if cached["version"] == (__version__, COMPILED_FORMAT) and unchanged:
+            recorder.records.extend(cached["warnings"])
+            return cached["config"]
+    except FileNotFoundError:
+        cached = {}
+    except Exception as error:  # pylint: disable=broad-except
+        logging.debug(f"ignoring config cache {cache_path}: {error}")
+        cached = {}
+
+    with open(path, "rb") as file:
+        content = file.read()
+
+    content_hash = hashlib.sha256(content).hexdigest()
 
-        self.mac: str = config.pop("mac")
+    # touched but not changed
+    if cached.get("version") == (__version__, COMPILED_FORMAT) and cached.get("hash") == content_hash:
+        compiled: Dict[str, Any] = cached["config"]
+        warnings: List[Tuple[int, str]] = cached["warnings"]
+        recorder.records.extend(warnings)
+    else:
+        start = len(recorder.records)
+        compiled = compile_config(content.decode())
+        warnings = [(level, message) for level, message in recorder.records[start:] if level >= logging.WARNING]
+
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+        with open(f"{cache_path}.tmp", "wb") as file:
+            pickle.dump(
+                {
+                    "version": (__version__, COMPILED_FORMAT),
+                    "mtime": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                    "hash": content_hash,
+                    "config": compiled,
+                    "warnings": warnings,
+                },
+                file,
+            )
+        os.replace(f"{cache_path}.tmp", cache_path)
+    except OSError as error:
+        logging.debug(f"could not cache compiled config in {cache_path}: {error}")
 
-        self.alias: Optional[str] = config.get("alias", None)
-        self.device_type = device_type
-        self.fail_silent = fail_silent
+    return compiled
 
-        # config file settings
-        self.config: Dict[str, Any] = config
 
-    @property
-    def name(self) -> str:
-        return self.alias if self.alias else self.mac
+class DeviceConfig:
+    """Stores the configuration of a sensor, immutable and with its topics resolved."""
+
+    __slots__ = (
+        "mac",
+        "alias",
+        "device_type",
+        "fail_silent",
+        "interval",
+        "interface",
+        "config",
+        "on_change",
+        "deadband",
+        "max_silence",
+        "payload_format",
+        "name",
+        "short_mac",
+        "device_topic",
+        "state_topic",
+        "history_topic",
+    )
+
+    mac: str
+    alias: Optional[str]
+    device_type: str
+    fail_silent: bool
+    interval: int
+    interface: Optional[str]
+    config: Mapping[str, Any]
+    on_change: bool
+    deadband: Dict[str, Deadband]
+    max_silence: float
+    payload_format: str
+    name: str
+    short_mac: str
+    device_topic: str
+    state_topic: str
+    history_topic: str
 
-    @property
-    def short_mac(self) -> str:
-        """Get the sensor mac without ':' in it."""
-        return self.mac.replace(":", "")
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        device_type: str,
+        fail_silent: bool = False,
+        interval: int = INTERVAL,
+        prefix: str = "",
+        trailing_slash: bool = False,
+        on_change: bool = False,
+        deadband: Optional[Dict[str, Any]] = None,
+        max_silence: float = MAX_SILENCE,
+        payload_format: str = "json",
+    ):
+        mac: str = config["mac"]
+        alias: Optional[str] = config.get("alias", None)
+        short_mac = mac.replace(":", "")
+        device_topic = f"{short_mac}_{alias.replace(' ', '_')}" if alias else short_mac
+        slash = "/" if trailing_slash else ""
+
+        attributes = {
+            "mac": mac,
+            "alias": alias,
+            "device_type": device_type,
+            "fail_silent": fail_silent,
+            # polling interval in seconds (daemon mode)
+            "interval": int(config.get("interval", interval)),
+            # optionally pin the sensor to an adapter
+            "interface": config.get("interface", None),
+            # config file settings (without the mac)
+            "config": MappingProxyType({key: value for key, value in config.items() if key != "mac"}),
+            # publish the state only if it changed beyond the deadbands or max_silence seconds passed
+            "on_change": bool(config.get("publish_on_change", on_change)),
+            "deadband": parse_deadbands({**(deadband or {}), **config.get("deadband", {})}),
+            "max_silence": config.get("max_silence", max_silence),
+            # encoding of the state and history messages, checked by localize() as it depends on the installed packages
+            "payload_format": config.get("payload_format", payload_format),
+            "name": alias if alias else mac,
+            "short_mac": short_mac,
+            "device_topic": device_topic,
+            "state_topic": f"{prefix}/{device_topic}{slash}",
+            "history_topic": f"{prefix}/{device_topic}_history{slash}",
+        }
+
+        for key, value in attributes.items():
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # the mapping proxy can not be pickled, rebuild from the original values
+        attributes = {slot: getattr(self, slot) for slot in self.__slots__}
+        return (_restore_device_config, ({**attributes, "config": dict(self.config)},))
+
+    def replace(self, **changes: Any) -> "DeviceConfig":
+        """Copy of the config with some attributes changed."""
+        return _restore_device_config({**{slot: getattr(self, slot) for slot in self.__slots__}, **changes})
+
+    def _key(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, slot) for slot in self.__slots__ if slot != "config") + (dict(self.config),)
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, DeviceConfig) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash((self.device_type, self.mac, self.alias))
 
     def get_topic(self) -> str:
         """Get the topic name for the sensor."""
@@ -203,6 +583,15 @@ class DeviceConfig:
         return f"{self.alias if self.alias else self.mac}{' (fail silent)' if self.fail_silent else ''}"
 
 
+def _restore_device_config(attributes: Dict[str, Any]) -> DeviceConfig:
+    device_config: DeviceConfig = object.__new__(DeviceConfig)
+
+    for key, value in attributes.items():
+        object.__setattr__(device_config, key, MappingProxyType(dict(value)) if key == "config" else value)
+
+    return device_config
+
+
 class Miblepy:
     """Main class of the module."""
 
@@ -215,44 +604,109 @@ class Miblepy:
     ):
         config_file_path = os.path.abspath(os.path.expanduser(config_file_path))
         self.config = Configuration(config_file_path, verbose=verbose, debug=debug)
+        self.verbose = verbose
+        self.debug = debug
 
         self.config.max_retries = retries
-        self.mqtt_client: Optional[mqtt.Client] = None
+        self.mqtt_client: Optional["mqtt.Client"] = None
         self.connected = False
 
+        # published messages not yet acknowledged by the broker
+        self.pending: Deque["mqtt.MQTTMessageInfo"] = deque()
+        self._pending_lock = threading.Lock()
+        self.ack_timer = metrics.AckTimer()
+        # (deadline, messages, callback) run once the broker acknowledged all the messages, e.g. to remember them
+        self.unconfirmed: List[Tuple[float, List["mqtt.MQTTMessageInfo"], Callable[[], None]]] = []
+        self._unconfirmed_lock = threading.Lock()
+
+        if self.config.metrics_port:
+            metrics.start_server(self.config.metrics_address, self.config.metrics_port)
+
+        # hashes of the published discovery configs by announce topic
+        self.announced = JsonStore(os.path.join(self.config.state_dir, "announced.json"))
+
+        # position of the last published history record by sensor mac
+        self.history = JsonStore(os.path.join(self.config.state_dir, "history.json"))
+
+        # last published state by state topic, for the sensors publishing on change only
+        self.changes = ChangeFilter(os.path.join(self.config.state_dir, "published.json"))
+
+        # fetch statistics by sensor mac, used to order the sensors
+        self.stats = SensorStats(os.path.join(self.config.state_dir, "stats.json"))
+
+        # fetch worker process by interface
+        self.workers: Dict[str, "FetchWorker"] = {}
+
+        # open connections of the streamed sensors (daemon mode)
+        self.streamer = NotificationStreamer(
+            self.config.interfaces, self.get_plugin, self.publish, self.config.max_streams, backoff=INITIAL_TIMEOUT
+        )
+
+        # leases of the sensors shared with other hosts
+        self.coordinator: Optional[Coordinator] = None
+        if cluster := self.config.cluster:
+            self.coordinator = Coordinator(
+                cluster["host"],
+                cluster["topic"],
+                self.config.sensors,
+                self._publish_retained,
+                lease_ttl=cluster["lease_ttl"],
+                settle=cluster["settle"],
+                signal=self._signal,
+                hysteresis=self.config.rssi_hysteresis,
+                changed=self._leases_changed,
+            )
+
+        # set to stop the daemon loop
+        self.stop_event = threading.Event()
+
+        # set by SIGHUP or the reload topic, the daemon loop reloads the config before the next fetch
+        self.reload_requested = threading.Event()
+
+        # wakes the daemon loop from waiting for the next due sensor
+        self.wakeup = threading.Event()
+
+        # set when a lease renewal in the background changed the sensors of this host, the daemon loop syncs the streams
+        self.leases_moved = threading.Event()
+
         # logging.getLogger().setLevel(logging.INFO)
         logging.info(
             f"{hl(__name__)} {__version__} | fetching from {hl(len(self.config.sensors))} sensors "
-            f"(of {hl(len(self.config.config_file['sensors']))} types) | max retries: {hl(self.config.max_retries)}"
+            f"(of {hl(len({sensor.device_type for sensor in self.config.sensors}))} types) | max retries: {hl(self.config.max_retries)}"
         )
 
         # set loglevel
         logging.getLogger().setLevel(self.config.loglevel)
 
         logging.info(
-            f"config file: {hl(config_file_path)} | interface: /dev/{hl(self.config.interface)} | "
+            f"config file: {hl(config_file_path)} | "
+            f"interface: {', '.join(f'/dev/{hl(interface)}' for interface in self.config.interfaces)} | "
             f"debug: {hl(self.config.debug)}"
         )
-        logging.debug(f"configuration: {self.config.config_file}")
+        logging.debug(f"configuration: {self.config}")
 
     def start_client(self) -> None:
         """Start the mqtt client."""
-        if not self.connected:
+        if not self.mqtt_client:
             self._start_client()
 
     def stop_client(self) -> None:
         """Stop the mqtt client."""
         if self.mqtt_client:
+            self.flush()
             if self.connected:
                 self.mqtt_client.disconnect()
                 self.connected = False
             self.mqtt_client.loop_stop()
+            self.mqtt_client = None
             logging.debug(
                 f"disconnected MQTT connection to server "
                 f"{hl(self.config.mqtt['server'] + ':' + str(self.config.mqtt['port']))}"
             )
 
     def _start_client(self) -> None:
+        import paho.mqtt.client as mqtt
+
         self.mqtt_client = mqtt.Client(self.config.mqtt["client_id"])
 
         if self.config.mqtt["user"]:
@@ -261,66 +715,342 @@ class Miblepy:
         if self.config.mqtt["ca_cert"]:
             self.mqtt_client.tls_set(self.config.mqtt["ca_cert"], cert_reqs=mqtt.ssl.CERT_REQUIRED)
 
+        # the broker drops our heartbeat if we vanish, the other hosts take over once our leases expire
+        if self.coordinator:
+            self.mqtt_client.will_set(self.coordinator.heartbeat_topic, "", qos=1, retain=True)
+
         def _on_connect(client: Any, _: Any, flags: Any, return_code: int) -> None:  # skipcq: PYL-W0613
             self.connected = True
             logging.debug(
                 f"MQTT connection to {hl(self.config.mqtt['server'] + ':' + str(self.config.mqtt['port']))} established"
             )
 
+            # subscribed on every connect, the session is not persisted by the broker
+            if reload_topic := self.config.mqtt.get("reload_topic"):
+                client.subscribe(reload_topic, qos=1)
+
+            for topic in self.coordinator.subscriptions if self.coordinator else []:
+                client.subscribe(topic, qos=1)
+
+        def _on_message(client: Any, _: Any, message: Any) -> None:  # skipcq: PYL-W0613
+            if self.coordinator and self.coordinator.handle(message.topic, message.payload):
+                return
+
+            # a retained command would reload on every reconnect
+            if message.topic != self.config.mqtt.get("reload_topic") or message.retain:
+                return
+
+            logging.info(f"received reload command on {hl(message.topic)}")
+            self.request_reload()
+
+        def _on_disconnect(client: Any, _: Any, return_code: int) -> None:  # skipcq: PYL-W0613
+            self.connected = False
+            if return_code:
+                # unexpected disconnect, the network loop reconnects on its own
+                logging.warning(
+                    f"MQTT connection to {hl(self.config.mqtt['server'] + ':' + str(self.config.mqtt['port']))} "
+                    f"lost ({return_code}), reconnecting..."
+                )
+
+        # keep many qos 1 messages in flight instead of waiting for each ack
+        self.mqtt_client.max_inflight_messages_set(self.config.mqtt["max_inflight"])
+
+        def _on_publish(client: Any, _: Any, mid: int) -> None:  # skipcq: PYL-W0613
+            self.ack_timer.acked(mid)
+
         self.mqtt_client.on_connect = _on_connect
+        self.mqtt_client.on_disconnect = _on_disconnect
+        self.mqtt_client.on_publish = _on_publish
+        self.mqtt_client.on_message = _on_message
 
         logging.debug(f"MQTT connecting to {hl(self.config.mqtt['server'] + ':' + str(self.config.mqtt['port']))}...")
         self.mqtt_client.connect(str(self.config.mqtt["server"]), int(self.config.mqtt["port"]), 60)
         self.mqtt_client.loop_start()
 
-    def _publisher(self, topic: str, data: Dict[str, Any]) -> None:
-        if self.config.mqtt["timestamp_format"]:
-            data["timestamp"] = datetime.now().strftime(self.config.mqtt["timestamp_format"])
+    def _publisher(
+        self,
+        topic: str,
+        data: Dict[str, Any],
+        kind: str = "state",
+        labels: Optional[Dict[str, str]] = None,
+        payload_format: str = "json",
+    ) -> Optional["mqtt.MQTTMessageInfo"]:
+        if timestamp_format := self.config.mqtt["timestamp_format"]:
+            # seconds since the epoch as a number for "unix", a formatted string otherwise
+            timestamp = time.time() if timestamp_format == "unix" else datetime.now().strftime(timestamp_format)
+            data = {**data, "timestamp": timestamp}
 
         if self.mqtt_client:
-            msg: mqtt.MQTTMessageInfo = self.mqtt_client.publish(topic, json.dumps(data), qos=1, retain=True)
-            msg.wait_for_publish()
-            logging.debug(f"sent {data} to topic {topic} - published: {msg.is_published()}")
+            started = time.perf_counter()
+            msg: "mqtt.MQTTMessageInfo" = self.mqtt_client.publish(
+                topic, encode(data, payload_format), qos=1, retain=True
+            )
+            logging.debug(f"sent {data} to topic {topic} - message id: {msg.mid}")
+
+            self.ack_timer.sent(msg.mid, started, labels or {})
+            metrics.MESSAGES.inc(kind=kind)
+
+            with self._pending_lock:
+                self.pending.append(msg)
+
+                # drop acknowledged messages, wait for the oldest one if too many are outstanding
+                while self.pending and (
+                    self.pending[0].is_published() or len(self.pending) > self.config.mqtt["max_inflight"]
+                ):
+                    self._wait_for_publish(self.pending.popleft(), time.monotonic() + self.config.mqtt["publish_timeout"])
+
+            return msg
+
+        return None
+
+    def _publish_retained(self, topic: str, payload: str) -> None:
+        """Publish a plain retained message, an empty one deletes the retained message of the topic."""
+        if self.mqtt_client:
+            self.mqtt_client.publish(topic, payload, qos=1, retain=True)
 
     @staticmethod
-    def _get_device_topic(sensor_config: DeviceConfig, suffix: Optional[str] = None) -> str:
-        device_topic = (
-            f"{sensor_config.short_mac}_{sensor_config.alias.replace(' ', '_')}"
-            if sensor_config.alias
-            else sensor_config.short_mac
-        )
+    def _wait_for_publish(msg: "mqtt.MQTTMessageInfo", deadline: float) -> bool:
+        """Wait until the broker acknowledged a message or the deadline passed."""
+        while not msg.is_published():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> int:
+        """Wait for all outstanding acknowledgements, return the number of unacknowledged messages."""
+        deadline = time.monotonic() + (timeout if timeout is not None else self.config.mqtt["publish_timeout"])
+
+        with self._pending_lock:
+            unacknowledged = sum(not self._wait_for_publish(msg, deadline) for msg in self.pending)
+            self.pending.clear()
+
+        if unacknowledged:
+            logging.warning(f"{hl(unacknowledged)} messages were not acknowledged by the broker in time")
+
+        return unacknowledged
+
+    def _when_acknowledged(
+        self, messages: List[Optional["mqtt.MQTTMessageInfo"]], callback: Callable[[], None]
+    ) -> None:
+        """Call back once the broker acknowledged all messages, never if one of them was not sent or got lost."""
+        if len(sent := [msg for msg in messages if msg]) < len(messages):
+            return
+
+        deadline = time.monotonic() + self.config.mqtt.get("publish_timeout", PUBLISH_TIMEOUT)
+
+        with self._unconfirmed_lock:
+            self.unconfirmed.append((deadline, sent, callback))
+
+    def _confirm(self, final: bool = False) -> None:
+        """Run the callbacks whose messages were acknowledged, drop the lost ones or with final all others."""
+        now = time.monotonic()
+        confirmed: List[Callable[[], None]] = []
 
-        return f"{device_topic}{f'_{suffix}' if suffix else ''}"
+        with self._unconfirmed_lock:
+            waiting, self.unconfirmed = self.unconfirmed, []
 
-    def _get_state_topic(self, sensor_config: DeviceConfig) -> str:
-        """Construct state topic to publish to."""
-        device_topic = self._get_device_topic(sensor_config, None)
+            for deadline, messages, callback in waiting:
+                # no messages e.g. if the deadbands held the state back, it was delivered before
+                if all(msg.is_published() for msg in messages):
+                    confirmed.append(callback)
+                elif not final and now < deadline:
+                    self.unconfirmed.append((deadline, messages, callback))
 
-        return f"{self.config.mqtt['prefix']}/{device_topic}{'/' if self.config.mqtt['trailing_slash'] else ''}"
+        for callback in confirmed:
+            callback()
 
     def _get_announce_topic(self, short_mac: str, name: str) -> str:
         """Construct announce topic to publish to."""
         return f"{self.config.mqtt['discovery_prefix']}/sensor/{short_mac}_{name}/config".replace(" ", "_")
 
-    def fetch(self, sensor_config: DeviceConfig) -> Dict[str, Any]:
+    @staticmethod
+    def is_streaming(sensor_config: DeviceConfig) -> bool:
+        """Check if the sensor should keep its connection open and push every measurement."""
+        if not sensor_config.config.get("stream"):
+            return False
+
+        miblepy_plugin = get_registry().get(sensor_config.device_type)
+        if not (miblepy_plugin and issubclass(miblepy_plugin["class"], MibleStreamingPlugin)):
+            logging.warning(f"· {hl(sensor_config.name)}: {sensor_config.device_type} can not stream, polling it")
+            return False
+
+        return True
+
+    @staticmethod
+    def is_advertising(sensor_config: DeviceConfig) -> bool:
+        """Check if the sensor is read from advertisements instead of a connection."""
+        miblepy_plugin = get_registry().get(sensor_config.device_type)
+        return bool(miblepy_plugin and issubclass(miblepy_plugin["class"], MibleAdvertisementPlugin))
+
+    def get_plugin(self, sensor_config: DeviceConfig, interface: Optional[str] = None) -> Optional[MibleDevicePlugin]:
+        """Create the plugin instance for a sensor."""
+        if miblepy_plugin := get_registry().get(sensor_config.device_type):
+            plugin_class = miblepy_plugin.get("class")
+            return plugin_class(  # type: ignore
+                sensor_config.mac,
+                interface or self.config.interface,
+                # a copy of the nested settings (e.g. the users of a scale), plugins must not change the config
+                **{"state_dir": self.config.state_dir, **copy.deepcopy(dict(sensor_config.config))},
+            )
+
+        return None
+
+    def _announcement(self, announce_topic: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Record to remember a discovery config by if it is new, changed or due for a refresh, None otherwise."""
+        payload_hash = hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()  # nosec
+        now = time.time()
+
+        if announced := self.announced.get(announce_topic):
+            refresh = self.config.mqtt["discovery_refresh"]
+            if announced["hash"] == payload_hash and (not refresh or now - announced["time"] < refresh):
+                return None
+
+        return {"hash": payload_hash, "time": now}
+
+    def fetch(self, sensor_config: DeviceConfig, interface: Optional[str] = None) -> Dict[str, Any]:
         """Get data from one Sensor."""
-        logging.info(f"· {hl(sensor_config.name)} ({sensor_config.mac}): fetching data from device...")
+        from bluepy import btle
+
+        from miblepy.supervisor import FetchTimeout, FetchWorker
+
+        interface = interface or self.config.interface
+        logging.info(
+            f"· {hl(sensor_config.name)} ({sensor_config.mac}): fetching data from device via {hl(interface)}..."
+        )
 
         data: Dict[str, Any] = {}
 
-        if miblepy_plugin := get_plugins().get(sensor_config.device_type):
-            plugin_class = miblepy_plugin.get("class")
-            plugin: MibleDevicePlugin = plugin_class(sensor_config.mac, self.config.interface, **sensor_config.config)
-        else:
+        if not (plugin := self.get_plugin(sensor_config, interface)):
             return data
 
+        timeout = sensor_config.config.get("timeout", plugin.fetch_timeout)
+        labels = {"plugin": plugin.plugin_id, "sensor": sensor_config.name}
+        result = "failure"
+
+        # a plain copy, it is sent to the worker process
+        config = dict(sensor_config.config)
+        if config.get("history"):
+            config["history_cursor"] = self.history.get(sensor_config.mac)
+
         try:
-            data = plugin.fetch_data(**sensor_config.config)
+            if self.config.isolate:
+                worker = self.workers.setdefault(interface, FetchWorker(self.config.loglevel))
+                data, timings = worker.fetch(plugin.__class__, sensor_config.mac, interface, config, timeout)
+            else:
+                data, timings = plugin.fetch_data(**config), plugin.timings
+
+            for phase, seconds in timings.items():
+                metrics.PHASE_SECONDS.observe(seconds, phase=phase, **labels)
+
         except btle.BTLEDisconnectError as error:
             logging.info(f"· {hl(sensor_config.name)}: ble disconnected: {error}")
+        except FetchTimeout as error:
+            result = "timeout"
+            logging.error(f"· {hl(sensor_config.name)}: {error}, fetch worker on {hl(interface)} replaced")
         except Exception as error:
             logging.error(f"· {hl(sensor_config.name)}: error when trying to fetch data: {error}")
 
+        metrics.FETCHES.inc(1, result="success" if data else result, **labels)
+
+        return self.publish(sensor_config, plugin, data)
+
+    def scan(self, sensors: Set[DeviceConfig], watched: Iterable[DeviceConfig] = ()) -> Set[DeviceConfig]:
+        """Get data from all advertising sensors in a single scan window.
+
+        With several adapters all of them listen during the window, to learn which one hears a sensor
+        best. The `watched` sensors are only listened to for their signal strength.
+        """
+        from miblepy.scanner import AdvertisementScanner
+
+        scanner = AdvertisementScanner(self.config.interface)
+        plugins: Dict[DeviceConfig, MibleAdvertisementPlugin] = {}
+
+        for sensor_config in sensors:
+            if isinstance(plugin := self.get_plugin(sensor_config), MibleAdvertisementPlugin):
+                scanner.add(plugin)
+                plugins[sensor_config] = plugin
+
+        # the other adapters only record the signal strength
+        scanners = [scanner] + [
+            AdvertisementScanner(interface) for interface in self.config.interfaces if interface != scanner.interface
+        ]
+        heard = set(plugins) | set(watched)
+
+        for listener in scanners if len(scanners) > 1 else []:
+            for sensor_config in heard:
+                listener.watch(sensor_config.mac)
+
+        timeout = scanner.timeout or self.config.rssi_scan
+
+        logging.info(
+            f"· scanning {hl(timeout)}s via {', '.join(hl(listener.interface) for listener in scanners)} "
+            f"for advertisements of {', '.join(hl(sensor_config.name) for sensor_config in plugins) or '-'}"
+            f"{f' and the signal of {hl(len(heard) - len(plugins))} sensors' if len(heard) > len(plugins) else ''}..."
+        )
+        started = time.monotonic()
+
+        threads = [
+            threading.Thread(target=listener.scan, args=(timeout,), name=f"miblepy-scan-{listener.interface}")
+            for listener in scanners[1:]
+            if listener.watched
+        ]
+        for thread in threads:
+            thread.start()
+
+        scanner.scan(timeout)
+
+        # the window of the other adapters closes with ours
+        for listener in scanners[1:]:
+            listener.finished.set()
+        for thread in threads:
+            thread.join()
+
+        duration = time.monotonic() - started
+        metrics.SCAN_SECONDS.observe(duration)
+
+        for listener in scanners:
+            for sensor_config in heard:
+                if rssi := listener.rssi.get(sensor_config.mac.lower()):
+                    self.stats.rssi(sensor_config.mac, rssi, listener.interface)
+
+        failed_sensors = set(sensors) - set(plugins)
+
+        for sensor_config, plugin in plugins.items():
+            labels = {"plugin": plugin.plugin_id, "sensor": sensor_config.name}
+            messages: List[Optional["mqtt.MQTTMessageInfo"]] = []
+
+            for phase, seconds in plugin.timings.items():
+                metrics.PHASE_SECONDS.observe(seconds, phase=phase, **labels)
+
+            metrics.FETCHES.inc(1, result="success" if plugin.data or plugin.done else "failure", **labels)
+
+            if not plugin.data and plugin.done:
+                # heard, but nothing new to publish (e.g. a repeated measurement)
+                logging.info(f"· {hl(sensor_config.name)}: no new data")
+                self.stats.success(sensor_config.mac, duration)
+            elif self.publish(sensor_config, plugin, plugin.data, messages):
+                self.stats.success(sensor_config.mac, duration)
+                self._when_acknowledged(messages, plugin.published)
+            else:
+                failed_sensors.add(sensor_config)
+
+        return failed_sensors
+
+    def publish(
+        self,
+        sensor_config: DeviceConfig,
+        plugin: MibleDevicePlugin,
+        data: Dict[str, Any],
+        messages: Optional[List[Optional["mqtt.MQTTMessageInfo"]]] = None,
+    ) -> Dict[str, Any]:
+        """Announce the entities of a sensor and publish its values, the state messages are added to messages."""
+        sent: List[Optional["mqtt.MQTTMessageInfo"]] = messages if messages is not None else []
+
+        # remember what was delivered since the last call, streamed sensors publish outside of the fetch cycles
+        self._confirm()
+
         if not data:
             logging.info(
                 f"· {hl(sensor_config.name)}: no data received from plugin "
@@ -330,10 +1060,19 @@ class Miblepy:
             return data
 
         entity_list = data.get("sensors", []) + data.get("binary_sensors", [])
+        labels = {"plugin": plugin.plugin_id, "sensor": sensor_config.name}
 
-        state_topic = self._get_state_topic(sensor_config)
+        state_topic = sensor_config.state_topic
         state_published = False
 
+        # nothing changed beyond the deadbands, the retained state is still up to date
+        state_due = not sensor_config.on_change or self.changes.due(
+            state_topic, data["attributes"], sensor_config.deadband, sensor_config.max_silence
+        )
+        if not state_due:
+            metrics.UNCHANGED.inc(sensor=sensor_config.name)
+            logging.info(f"· {hl(sensor_config.name)}: no significant change, not sending sensor values")
+
         for entity in entity_list:
             entity_name = entity["name"]
             entity_type: ATTRS = entity["entity_type"]
@@ -361,131 +1100,453 @@ class Miblepy:
                 ).replace(" ", "_")
 
                 payload["json_attributes_topic"] = payload["state_topic"]
+                state_published = True
 
                 # push sensor values
-                self._publisher(payload["state_topic"], data["attributes"])
-                state_published = True
-                logging.info(f"· {hl(sensor_config.name)}: sent sensor values to {hl(payload['state_topic'])}")
+                if state_due:
+                    sent.append(
+                        self._publisher(
+                            payload["state_topic"],
+                            data["attributes"],
+                            labels=labels,
+                            payload_format=sensor_config.payload_format,
+                        )
+                    )
+                    logging.info(f"· {hl(sensor_config.name)}: sent sensor values to {hl(payload['state_topic'])}")
 
-            self._publisher(announce_topic, payload)
-            logging.info(f"· {hl(sensor_config.name)}: sent {hl(entity_name)} configuration to {hl(announce_topic)}")
+            if announcement := self._announcement(announce_topic, payload):
+                msg = self._publisher(announce_topic, payload, kind="announce", labels=labels)
+                # not announced again until the refresh, remembered only once it arrived
+                self._when_acknowledged([msg], partial(self.announced.set, announce_topic, announcement))
+                logging.info(
+                    f"· {hl(sensor_config.name)}: sent {hl(entity_name)} configuration to {hl(announce_topic)}"
+                )
 
         # push sensor values
-        if not state_published:
-            self._publisher(state_topic, data["attributes"])
+        if state_due and not state_published:
+            msg = self._publisher(
+                state_topic, data["attributes"], labels=labels, payload_format=sensor_config.payload_format
+            )
+            sent.append(msg)
             logging.info(f"· {hl(sensor_config.name)}: sent sensor values to {hl(state_topic)}")
 
+        if state_due and sensor_config.on_change:
+            self.changes.published(state_topic, data["attributes"])
+
+        if "history_cursor" in data:
+            batches = self.publish_history(sensor_config, data.get("history", []), labels)
+            # a lost batch is read from the device again, the cursor moves only once all of them arrived
+            self._when_acknowledged(batches, partial(self.history.set, sensor_config.mac, data["history_cursor"]))
+
         return data
 
-    def go(self) -> Set[DeviceConfig]:
-        """Get data from all sensors."""
-        sensors_list: Set[DeviceConfig] = set(self.config.sensors)
+    def publish_history(
+        self, sensor_config: DeviceConfig, records: List[Dict[str, Any]], labels: Dict[str, str]
+    ) -> List[Optional["mqtt.MQTTMessageInfo"]]:
+        """Publish history records with their original timestamps in batches, return the messages."""
+        if not records:
+            return []
+
+        topic = sensor_config.history_topic
+        batch_size = sensor_config.config.get("history_batch", HISTORY_BATCH)
+
+        batches = [
+            self._publisher(
+                topic,
+                {"records": records[start : start + batch_size]},
+                kind="history",
+                labels=labels,
+                payload_format=sensor_config.payload_format,
+            )
+            for start in range(0, len(records), batch_size)
+        ]
+
+        logging.info(f"· {hl(sensor_config.name)}: sent {hl(len(records))} history records to {hl(topic)}")
+
+        return batches
 
-        # initial timeout in seconds
-        timeout = INITIAL_TIMEOUT
+    def _fetch_sensor(self, sensor: DeviceConfig, interface: str) -> bool:
+        """Fetch a sensor and report if it succeeded, failures are recorded once per cycle by go()."""
+        started = time.monotonic()
 
-        retry_count = 1
+        try:
+            if self.fetch(sensor, interface):
+                self.stats.success(sensor.mac, time.monotonic() - started)
+                return True
+
+        except Exception as exception:  # pylint: disable=bare-except, broad-except
+
+            msg = f"{hl(sensor.name)}: could not read data with reason: {str(exception)}"
+
+            if sensor.fail_silent:
+                logging.error(msg)
+            else:
+                logging.exception(msg)
+                print(msg)
 
+        return False
+
+    def go(self, sensors: Optional[Iterable[DeviceConfig]] = None) -> Set[DeviceConfig]:
+        """Get data from all (or the given) sensors."""
+        sensors_list: Set[DeviceConfig] = set(sensors if sensors is not None else self.config.sensors)
+        started = time.monotonic()
+
+        # the network loop reconnects on its own, give up this cycle if the broker stays away
+        connect_deadline = time.monotonic() + CONNECT_TIMEOUT
         while not self.connected:
             self.start_client()
-            time.sleep(0.1)
 
-        while retry_count <= self.config.max_retries and sensors_list:
+            if self.stop_event.wait(0.1):
+                return sensors_list
 
-            # if this is not the first try: wait some time before trying again
-            if retry_count > 1:
-                logging.info(
-                    f"try {retry_count}/{self.config.max_retries} for "
-                    f"{', '.join((hl(str(sensor.alias)) for sensor in sensors_list))} in {hl(timeout)}s"
-                )
-                time.sleep(timeout)
+            if time.monotonic() >= connect_deadline:
+                broker = f"{self.config.mqtt['server']}:{self.config.mqtt['port']}"
+                logging.error(f"no connection to MQTT broker {hl(broker)} after {CONNECT_TIMEOUT}s, skipping the cycle")
+                return sensors_list
+
+        # streamed sensors publish on their own
+        sensors_list -= set(self.streamer.streams)
 
-                # exponential backoff-time
-                timeout *= 2
+        # sensors leased to other hosts are left to them
+        leased_elsewhere: Set[DeviceConfig] = set()
+        if self.coordinator:
+            self.coordinator.join()
+            self.coordinator.tick()
+            leased_elsewhere = sensors_list - self.coordinator.owned(sensors_list)
+            sensors_list -= leased_elsewhere
 
-            # collect failed sensor for next round
-            failed_sensors_list: Set[DeviceConfig] = set()
+        if not sensors_list:
+            logging.debug(f"nothing to fetch, {len(leased_elsewhere)} sensors leased to other hosts")
+            return set()
 
-            # increment retry counter
-            retry_count += 1
+        sensors_count = len(sensors_list)
 
-            shuffle([sensors_list])
+        # circuit breaker: skip sensors which failed too often until their cool-off passed
+        now = time.time()
+        parked_sensors: Set[DeviceConfig] = set()
+        for sensor in sensors_list:
+            if self._parked_until(sensor) > now:
+                parked_sensors.add(sensor)
 
-            # process sensors in list
-            for sensor in sensors_list:
+        sensors_list -= parked_sensors
 
-                try:
-                    if not self.fetch(sensor):
-                        # try again in the next round
-                        failed_sensors_list.add(sensor)
+        failed_sensors_list: Set[DeviceConfig] = set()
 
-                except Exception as exception:  # pylint: disable=bare-except, broad-except
+        # all advertising sensors share one scan window per try
+        advertising_sensors = {sensor for sensor in sensors_list if self.is_advertising(sensor)}
+        remaining_sensors = advertising_sensors
 
-                    # try again in the next round
-                    failed_sensors_list.add(sensor)
+        # with several adapters the connection based sensors are listened to in the first scan window, a window
+        # just for them is only opened if some of them were not heard recently
+        watched = self._routed(sensors_list - advertising_sensors)
+        if not advertising_sensors and all(self.stats.signal(sensor.mac, self.config.interfaces) for sensor in watched):
+            watched = set()
 
-                    msg = f"{hl(sensor.config.name)}: could not read data with reason: {str(exception)}"  # type: ignore
+        for _ in range(self.config.max_retries):
+            if not remaining_sensors and not watched:
+                break
 
-                    if sensor.fail_silent:
-                        logging.error(msg)
-                        # logging.warning(
-                        #     "fail_silent is set for sensor %s, so not raising an exception.",
-                        #     sensor.alias,
-                        # )
-                    else:
-                        logging.exception(msg)
-                        print(msg)
+            try:
+                remaining_sensors = self.scan(remaining_sensors, watched)
+            except Exception as exception:  # pylint: disable=broad-except
+                logging.error(f"could not scan for advertisements with reason: {str(exception)}")
 
-            sensors_list = failed_sensors_list
+            watched = set()
+
+        failed_sensors_list.update(remaining_sensors)
+
+        # process sensors in list, in parallel if there are multiple adapters. failed sensors are
+        # retried with their own backoff while the others are fetched
+        scheduler = AdapterScheduler(
+            self.config.interfaces, self._fetch_sensor, self._max_attempts, backoff=INITIAL_TIMEOUT, route=self._route
+        )
+        # reliable and fast sensors first, the ones failing repeatedly last
+        failed_sensors_list.update(scheduler.run(self.stats.order(sensors_list - advertising_sensors)))
+
+        # one failure per cycle for the circuit breaker, however many tries it took. advertising sensors are
+        # silent until they have something to tell (e.g. the scale), not hearing them is no failure
+        for sensor in failed_sensors_list - advertising_sensors:
+            self.stats.failure(sensor.mac)
+
+        # wait once for all outstanding acknowledgements
+        self.flush()
+        self._confirm(final=True)
+        metrics.CYCLE_SECONDS.observe(time.monotonic() - started)
+        self._publish_metrics()
+        self.announced.save()
+        self.changes.save()
+        self.history.save()
+        self.stats.save()
 
         # build summary message
         result_message = (
-            f"successfully fetched data from {hl(len(self.config.sensors) - len(failed_sensors_list))} devices"
+            f"successfully fetched data from "
+            f"{hl(sensors_count - len(failed_sensors_list) - len(parked_sensors))} devices"
         )
 
         # check if have failed ones
         if failed_sensors_list:
             result_message += (
-                f" | {hl(len(failed_sensors_list))} failed (after {retry_count - 1} retries): "
-                f"{', '.join((hl(str(sensor.alias)) for sensor in sensors_list))}"
+                f" | {hl(len(failed_sensors_list))} failed (after up to {self.config.max_retries} tries): "
+                f"{', '.join((hl(str(sensor.name)) for sensor in failed_sensors_list))}"
             )
 
+        if parked_sensors:
+            result_message += (
+                f" | {hl(len(parked_sensors))} parked after failing repeatedly: "
+                f"{', '.join((hl(str(sensor.name)) for sensor in parked_sensors))}"
+            )
+
+        if leased_elsewhere:
+            result_message += f" | {hl(len(leased_elsewhere))} leased to other hosts"
+
         logging.getLogger().setLevel(logging.INFO)
         logging.info(result_message)
+        logging.getLogger().setLevel(self.config.loglevel)
 
-        # return sensors that could not be processed after max_retries
-        return failed_sensors_list
+        # return sensors that could not be processed
+        return failed_sensors_list | parked_sensors
 
+    def _publish_metrics(self) -> None:
+        """Publish counters and latency sums/counts to the metrics topic, if configured."""
+        if self.mqtt_client and (metrics_topic := self.config.mqtt["metrics_topic"]):
+            self.mqtt_client.publish(metrics_topic, json.dumps(metrics.samples()), qos=0, retain=False)
 
-def get_plugins() -> Dict[str, Any]:
-    """Discover available device plugins in plugin dir."""
-    plugin_path = os.path.join(os.path.dirname(__file__), "devices")
-    modules = pkgutil.iter_modules(path=[plugin_path])
+    def _routed(self, sensors: Iterable[DeviceConfig]) -> Set[DeviceConfig]:
+        """Sensors which are routed to the adapter hearing them best."""
+        if len(self.config.interfaces) < 2 or not self.config.rssi_scan:
+            return set()
+
+        return {sensor for sensor in sensors if not sensor.interface}
+
+    def _route(self, sensor: DeviceConfig) -> Optional[str]:
+        """Adapter to connect to a sensor with, None if any will do."""
+        if not self._routed([sensor]):
+            return None
 
-    plugins: Dict[str, Any] = {}
+        return self.stats.adapter(sensor.mac, self.config.interfaces, self.config.rssi_hysteresis)
 
-    for loader, mod_name, ispkg in modules:
+    def _signal(self, sensor: DeviceConfig) -> Optional[float]:
+        """Best signal strength any adapter of this host hears a sensor with."""
+        return max(self.stats.signal(sensor.mac, self.config.interfaces).values(), default=None)
+
+    def _parked_until(self, sensor: DeviceConfig) -> float:
+        return self.stats.parked_until(sensor.mac, self.config.breaker_threshold, self.config.breaker_cooloff)
+
+    def _max_attempts(self, sensor: DeviceConfig) -> int:
+        """Sensors coming back from the circuit breaker get a single trial fetch."""
+        return 1 if self._parked_until(sensor) else self.config.max_retries
+
+    def _leases_changed(self) -> None:
+        """Let the daemon loop follow the sensors this host holds the leases of."""
+        self.leases_moved.set()
+        self.wakeup.set()
+
+    def request_reload(self) -> None:
+        """Let the daemon loop reload the config file before the next fetch."""
+        self.reload_requested.set()
+        self.wakeup.set()
+
+    @staticmethod
+    def _sensor_key(sensor: DeviceConfig) -> Tuple[str, str]:
+        """Identity of a sensor across config reloads, everything else may change."""
+        return sensor.device_type, sensor.mac.lower()
+
+    def reload(self) -> Dict[str, Set[DeviceConfig]]:
+        """Re-read the config file and apply the difference to the running instance.
+
+        The mqtt session, the fetch workers and the per-sensor state are kept. Added,
+        removed and changed sensors are returned, changed ones are announced again.
+        """
+        changes: Dict[str, Set[DeviceConfig]] = {"added": set(), "removed": set(), "changed": set()}
 
         try:
-            imported_package = importlib.import_module(f"miblepy.devices.{mod_name}")
+            config = Configuration(self.config.path, verbose=self.verbose, debug=self.debug)
+        except Exception as error:  # pylint: disable=broad-except
+            logging.error(f"could not reload {hl(self.config.path)}, keeping the current config: {error}")
+            return changes
+
+        # given on the command line
+        config.max_retries = self.config.max_retries
+
+        old = {self._sensor_key(sensor): sensor for sensor in self.config.sensors}
+        new = {self._sensor_key(sensor): sensor for sensor in config.sensors}
+
+        changes["added"] = {new[key] for key in new.keys() - old.keys()}
+        changes["removed"] = {old[key] for key in old.keys() - new.keys()}
+        changes["changed"] = {new[key] for key in new.keys() & old.keys() if new[key] != old[key]}
+
+        # forget the discovery configs of changed sensors, they are announced again on their next fetch
+        for sensor in changes["changed"] | changes["removed"]:
+            for topic in self.announced:
+                if topic.startswith(f"{self.config.mqtt.get('discovery_prefix')}/sensor/{sensor.short_mac}_"):
+                    self.announced.pop(topic)
+
+        # and their last published state, changed sensors publish right away
+        for key, sensor in old.items():
+            if new.get(key) != sensor:
+                self.changes.forget(sensor.state_topic)
+
+        if config.mqtt != self.config.mqtt:
+            logging.info("mqtt settings changed, reconnecting...")
+            self.stop_client()
+            self.config.mqtt = config.mqtt
+            self.start_client()
 
-            for (key, value) in inspect.getmembers(imported_package, inspect.isclass):
+        # workers of adapters which are gone, or all of them if fetches run in-process now
+        for interface in list(self.workers):
+            if not config.isolate or interface not in config.interfaces:
+                self.workers.pop(interface).stop()
 
-                if issubclass(value, MibleDevicePlugin) & (value is not MibleDevicePlugin):
+        if self.coordinator:
+            self.coordinator.update(config.sensors)
 
-                    plugins.update(
-                        {
-                            mod_name: {
-                                "module": value.__module__,
-                                "class_name": value.__name__,
-                                "class": getattr(importlib.import_module(value.__module__), value.__name__),
-                                "config_key": mod_name,
-                            }
-                        }
-                    )
+        for setting in ("state_dir", "metrics_port", "metrics_address", "cluster"):
+            if getattr(config, setting) != getattr(self.config, setting):
+                logging.warning(f"{setting} changed, it is applied after a restart")
+
+        self.config = config
+
+        logging.getLogger().setLevel(logging.INFO)
+        logging.info(
+            f"reloaded {hl(self.config.path)} | "
+            + " | ".join(
+                f"{hl(len(sensors))} {change}"
+                + (f": {', '.join(hl(sensor.name) for sensor in sensors)}" if sensors else "")
+                for change, sensors in changes.items()
+            )
+        )
+        logging.getLogger().setLevel(self.config.loglevel)
+
+        return changes
+
+    def _sync_streams(self) -> None:
+        """Open or close the streams to match the streamed sensors (of this host)."""
+        self.streamer.interfaces = self.config.interfaces
+        self.streamer.max_streams = self.config.max_streams
+
+        sensors = [sensor for sensor in self.config.sensors if self.is_streaming(sensor)]
+        if self.coordinator:
+            owned = self.coordinator.owned(sensors)
+            sensors = [sensor for sensor in sensors if sensor in owned]
+
+        self.streamer.sync(sensors)
+
+    def _reschedule(self, schedule: List[Tuple[float, int, DeviceConfig]]) -> List[Tuple[float, int, DeviceConfig]]:
+        """Reload the config, unchanged sensors keep their due time and new or changed ones are due now."""
+        changes = self.reload()
+
+        due_times = {self._sensor_key(sensor): due_time for due_time, _, sensor in schedule}
+        for sensor in changes["changed"]:
+            due_times.pop(self._sensor_key(sensor), None)
+
+        now = time.monotonic()
+        schedule = [
+            (due_times.get(self._sensor_key(sensor), now), position, sensor)
+            for position, sensor in enumerate(self.config.sensors)
+        ]
+        heapify(schedule)
+
+        self._sync_streams()
+
+        return schedule
+
+    def run(self) -> None:
+        """Keep running and fetch every sensor on its own interval."""
 
-        except (ModuleNotFoundError, ImportError) as error:
-            print(error)
-            pass
+        def _stop(signum: int, _: Any) -> None:
+            logging.info(f"received signal {hl(signum)}, stopping...")
+            self.stop_event.set()
+            self.wakeup.set()
 
-    return plugins
+        def _reload(signum: int, _: Any) -> None:
+            logging.info(f"received signal {hl(signum)}, reloading config...")
+            self.request_reload()
+
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+        signal.signal(signal.SIGHUP, _reload)
+
+        # streams publish as soon as they are open
+        self.start_client()
+
+        # (next due time, position in config, sensor), streamed sensors or the ones
+        # leased to other hosts are skipped when due
+        schedule: List[Tuple[float, int, DeviceConfig]] = []
+
+        now = time.monotonic()
+        for position, sensor in enumerate(self.config.sensors):
+            heappush(schedule, (now, position, sensor))
+
+        if self.coordinator:
+            self.coordinator.join()
+            self.coordinator.tick()
+
+        self._sync_streams()
+
+        streamed = ", ".join(hl(sensor.name) for sensor in self.streamer.streams)
+        logging.info(
+            f"running as daemon | intervals: "
+            f"{', '.join(f'{hl(sensor.name)} {sensor.interval}s' for sensor in self.config.sensors)}"
+            f"{f' | streaming: {streamed}' if streamed else ''}"
+            f"{f' | cluster host: {hl(self.coordinator.host)}' if self.coordinator else ''}"
+        )
+
+        while not self.stop_event.is_set():
+
+            if self.reload_requested.is_set():
+                self.reload_requested.clear()
+                schedule = self._reschedule(schedule)
+
+            # streams follow the sensors we hold, the leases are renewed in the background
+            if self.coordinator and (self.coordinator.tick() or self.leases_moved.is_set()):
+                self.leases_moved.clear()
+                self._sync_streams()
+
+            # wait until the next sensor is due
+            wait = schedule[0][0] - time.monotonic() if schedule else None
+
+            if wait is None or wait > 0:
+                self.wakeup.wait(wait)
+                self.wakeup.clear()
+                continue
+
+            now = time.monotonic()
+            due: List[Tuple[float, int, DeviceConfig]] = []
+            while schedule and schedule[0][0] <= now:
+                due.append(heappop(schedule))
+
+            self.go(sensor for _, _, sensor in due)
+
+            # reschedule, but never in the past if a cycle took longer than an interval
+            now = time.monotonic()
+            for due_time, position, sensor in due:
+                heappush(schedule, (max(due_time + sensor.interval, now), position, sensor))
+
+        self.shutdown()
+
+    def shutdown(self, release: bool = True) -> None:
+        """Stop the streams, the fetch workers and the mqtt client, release the cluster leases or let them expire."""
+        self.streamer.stop_all()
+
+        # hand our sensors over to the other hosts right away, or keep them until the next one-shot fetch
+        if self.coordinator and release:
+            self.coordinator.release()
+        elif self.coordinator:
+            self.coordinator.stop()
+
+        for worker in self.workers.values():
+            worker.stop()
+
+        self.stop_client()
+        self._confirm(final=True)
+
+        # streamed sensors publish outside of the fetch rounds
+        self.announced.save()
+        self.changes.save()
+        self.stats.save()
+
+
+def get_plugins() -> Dict[str, Any]:
+    """Get all available device plugins."""
+    return get_registry().all()
@@ -0,0 +1,90 @@
+import logging
+import time
+
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from miblepy.state import JsonStore
+
+
+# seconds after which the state is published again even if nothing changed
+MAX_SILENCE = 60 * 60
+
+# attributes which differ in every message and never count as a change
+VOLATILE = ("timestamp",)
+
+# allowed change of an attribute, absolute or relative (in percent) to the last published value
+Deadband = Tuple[float, bool]
+
+
+def parse_deadbands(deadbands: Mapping[str, Any]) -> Dict[str, Deadband]:
+    """Deadbands by attribute from the config, a number is absolute and a string like "5%" relative."""
+    parsed: Dict[str, Deadband] = {}
+
+    for attribute, band in deadbands.items():
+        relative = isinstance(band, str) and band.strip().endswith("%")
+
+        try:
+            value = float(band.strip().rstrip("%") if isinstance(band, str) else band)
+        except (TypeError, ValueError):
+            value = -1
+
+        if value < 0 or isinstance(band, bool) or (isinstance(band, str) and not relative):
+            logging.error(f"deadband of {attribute} must be a positive number or percentage, not {band!r}, ignoring it")
+            continue
+
+        parsed[attribute] = (value, relative)
+
+    return parsed
+
+
+def exceeds(old: Any, new: Any, deadband: Optional[Deadband]) -> bool:
+    """Check if an attribute moved beyond its deadband, without one any change counts."""
+    if deadband is None:
+        return bool(old != new)
+
+    try:
+        old_value, new_value = float(old), float(new)
+    except (TypeError, ValueError):
+        return bool(old != new)
+
+    limit, relative = deadband
+    if relative:
+        limit = abs(old_value) * limit / 100
+
+    return abs(new_value - old_value) > limit
+
+
+class ChangeFilter:
+    """Last published state per topic, kept between runs to publish only meaningful changes."""
+
+    def __init__(self, path: str):
+        self.store = JsonStore(path)
+
+    def due(
+        self, topic: str, attributes: Dict[str, Any], deadbands: Mapping[str, Deadband], max_silence: float
+    ) -> bool:
+        """Check if the state changed beyond the deadbands or was not published for max_silence seconds."""
+        if not (last := self.store.get(topic)):
+            return True
+
+        if max_silence and time.time() - last["time"] >= max_silence:
+            return True
+
+        published: Dict[str, Any] = last["values"]
+        values = {key: value for key, value in attributes.items() if key not in VOLATILE}
+
+        if values.keys() != published.keys():
+            return True
+
+        return any(exceeds(published[key], value, deadbands.get(key)) for key, value in values.items())
+
+    def published(self, topic: str, attributes: Dict[str, Any]) -> None:
+        """Remember a published state as the reference for the deadbands."""
+        values = {key: value for key, value in attributes.items() if key not in VOLATILE}
+        self.store.set(topic, {"values": values, "time": time.time()})
+
+    def forget(self, topic: str) -> None:
+        self.store.pop(topic)
+
+    def save(self) -> None:
+        self.store.save()
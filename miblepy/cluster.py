@@ -0,0 +1,294 @@
+"""Share the sensors between several hosts through leases on the mqtt broker.
+
+Every host publishes a retained heartbeat listing the sensors in its config and
+how well it hears them to `<topic>/hosts/<host>`. A sensor belongs to the live
+host with the highest rendezvous hash of host and mac among the hosts which have
+it configured, so a host joining or leaving only moves its own share of the
+sensors. Hosts hearing a sensor more than `hysteresis` dB worse than the best
+one are left out, the current holder keeps a sensor as long as it is not.
+
+A host fetches a sensor only while it holds the lease of it, a retained message
+on `<topic>/leases/<mac>` renewed every third of the lease time by a thread of
+its own, so the leases outlive fetch cycles longer than the lease time. The lease of
+another host is respected until it expires or is released, sensors moving to a
+new host are released by their old one. Expiry is based on the wall clock in
+the messages, the clocks of the hosts have to be in sync (NTP).
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Set
+
+
+if TYPE_CHECKING:
+    from miblepy import DeviceConfig
+
+
+# seconds a lease or heartbeat is valid without being renewed
+LEASE_TTL = 60
+
+# seconds to collect the heartbeats and leases of the other hosts before claiming sensors
+SETTLE = 2
+
+# dB another host has to hear a sensor better to take it over
+HYSTERESIS = 6
+
+
+def weight(host: str, mac: str) -> int:
+    """Rendezvous hash of a host for a sensor."""
+    return int(hashlib.sha1(f"{host}/{mac}".encode()).hexdigest()[:16], 16)  # nosec
+
+
+class Coordinator:
+    """Claims, renews and releases the leases of the sensors of this host."""
+
+    def __init__(
+        self,
+        host: str,
+        topic: str,
+        sensors: Iterable["DeviceConfig"],
+        publish: Callable[[str, str], None],
+        lease_ttl: float = LEASE_TTL,
+        settle: float = SETTLE,
+        clock: Callable[[], float] = time.time,
+        signal: Optional[Callable[["DeviceConfig"], Optional[float]]] = None,
+        hysteresis: float = HYSTERESIS,
+        changed: Optional[Callable[[], None]] = None,
+    ):
+        self.host = host
+        self.topic = topic.rstrip("/")
+        self.publish = publish
+        self.lease_ttl = lease_ttl
+        self.clock = clock
+        self.signal = signal
+        self.hysteresis = hysteresis
+        # called when a renewal in the background changed the sensors of this host
+        self.changed = changed
+
+        # sensors in our config by short mac
+        self.sensors: Dict[str, "DeviceConfig"] = {}
+        self.macs: Set[str] = set()
+        self.update(sensors)
+
+        # heartbeats by host and leases by short mac, as last received
+        self.hosts: Dict[str, Dict[str, Any]] = {}
+        self.leases: Dict[str, Dict[str, Any]] = {}
+
+        self.settled_at = clock() + settle
+        self.next_tick = 0.0
+
+        self._lock = threading.Lock()
+
+        # tick() runs on the renewal thread and on the one of the caller
+        self._tick_lock = threading.Lock()
+        self._renewal: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @property
+    def subscriptions(self) -> List[str]:
+        return [f"{self.topic}/hosts/+", f"{self.topic}/leases/+"]
+
+    @property
+    def heartbeat_topic(self) -> str:
+        return f"{self.topic}/hosts/{self.host}"
+
+    def lease_topic(self, mac: str) -> str:
+        return f"{self.topic}/leases/{mac}"
+
+    def update(self, sensors: Iterable["DeviceConfig"]) -> None:
+        """Set the sensors of this host, e.g. after a config reload."""
+        self.sensors = {sensor.short_mac: sensor for sensor in sensors}
+        self.macs = set(self.sensors)
+        self.next_tick = 0.0
+
+    def handle(self, topic: str, payload: bytes) -> bool:
+        """Take a heartbeat or lease message, False if the topic is none of ours."""
+        if not topic.startswith(f"{self.topic}/"):
+            return False
+
+        kind, _, name = topic[len(self.topic) + 1 :].partition("/")
+
+        try:
+            message = json.loads(payload) if payload else None
+        except ValueError:
+            logging.warning(f"ignoring malformed cluster message on {topic}: {payload!r}")
+            return True
+
+        if kind not in ("hosts", "leases") or not isinstance(message, (dict, type(None))):
+            return True
+
+        with self._lock:
+            messages = self.hosts if kind == "hosts" else self.leases
+
+            # an empty message releases the lease or announces a clean shutdown
+            if message is None:
+                messages.pop(name, None)
+            else:
+                messages[name] = message
+
+        return True
+
+    def heard(self) -> Dict[str, float]:
+        """Signal strength of our sensors by short mac, as far as we heard them."""
+        if not self.signal:
+            return {}
+
+        return {mac: rssi for mac, sensor in self.sensors.items() if (rssi := self.signal(sensor)) is not None}
+
+    def alive(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """Live hosts, including this one, with their sensors and how well they hear them."""
+        now = self.clock()
+
+        with self._lock:
+            hosts = {
+                host: {mac: heartbeat.get("rssi", {}).get(mac) for mac in heartbeat.get("sensors", [])}
+                for host, heartbeat in self.hosts.items()
+                if heartbeat.get("time", 0) + heartbeat.get("ttl", self.lease_ttl) > now
+            }
+
+        heard = self.heard()
+        hosts[self.host] = {mac: heard.get(mac) for mac in self.macs}
+
+        return hosts
+
+    def owner(self, mac: str, hosts: Optional[Dict[str, Dict[str, Optional[float]]]] = None) -> Optional[str]:
+        """Live host a sensor belongs to."""
+        candidates = {host: sensors[mac] for host, sensors in (hosts or self.alive()).items() if mac in sensors}
+
+        if heard := {host: rssi for host, rssi in candidates.items() if rssi is not None}:
+            best = max(heard.values())
+            eligible = [host for host, rssi in heard.items() if rssi >= best - self.hysteresis]
+
+            # no flapping between hosts hearing a sensor about equally well
+            if (holder := self.holder(mac)) in eligible:
+                return holder
+        else:
+            eligible = list(candidates)
+
+        return max(eligible, key=lambda host: weight(host, mac)) if eligible else None
+
+    def holder(self, mac: str) -> Optional[str]:
+        """Host holding a valid lease of a sensor."""
+        with self._lock:
+            lease = self.leases.get(mac)
+
+        return lease["host"] if lease and lease.get("expires", 0) > self.clock() else None
+
+    @property
+    def settled(self) -> bool:
+        return self.clock() >= self.settled_at
+
+    def join(self) -> None:
+        """Announce this host, start renewing and wait until the messages of the other hosts had time to arrive."""
+        self.tick()
+        self.start()
+
+        if (remaining := self.settled_at - self.clock()) > 0:
+            time.sleep(remaining)
+
+    def start(self) -> None:
+        """Renew the heartbeat and the leases in the background, also while a fetch cycle runs."""
+        if self._renewal and self._renewal.is_alive():
+            return
+
+        self._stopped.clear()
+        self._renewal = threading.Thread(target=self._renew, name="miblepy-cluster", daemon=True)
+        self._renewal.start()
+
+    def stop(self) -> None:
+        """Stop renewing, the leases expire unless tick() is called."""
+        self._stopped.set()
+
+        if self._renewal:
+            self._renewal.join()
+            self._renewal = None
+
+    def _renew(self) -> None:
+        while not self._stopped.wait(max(self.next_tick - self.clock(), 0)):
+            try:
+                if self.tick() and self.changed:
+                    self.changed()
+            except Exception as error:  # pylint: disable=broad-except
+                logging.error(f"renewing the cluster leases failed: {error}")
+
+    def tick(self) -> bool:
+        """Send the heartbeat, renew, claim and release leases if due, return if our sensors changed."""
+        with self._tick_lock:
+            return self._tick()
+
+    def _tick(self) -> bool:
+        now = self.clock()
+
+        if now < self.next_tick:
+            return False
+
+        self.next_tick = now + self.lease_ttl / 3
+        before = self.owned_macs()
+
+        heartbeat = {
+            "host": self.host,
+            "time": now,
+            "ttl": self.lease_ttl,
+            "sensors": sorted(self.macs),
+            "rssi": self.heard(),
+        }
+        self._send(self.heartbeat_topic, heartbeat)
+
+        # only heartbeats until we know the other hosts
+        if not self.settled:
+            self.next_tick = min(self.next_tick, self.settled_at)
+            return False
+
+        hosts = self.alive()
+
+        for mac in sorted(self.macs):
+            holder = self.holder(mac)
+            ours = self.owner(mac, hosts) == self.host
+
+            if ours and holder in (None, self.host):
+                # claim or renew, a claim of another host arriving later wins
+                self._send(self.lease_topic(mac), {"host": self.host, "expires": now + self.lease_ttl})
+            elif not ours and holder == self.host:
+                logging.info(f"· {mac}: moved to host {self.owner(mac, hosts)}, releasing its lease")
+                self._send(self.lease_topic(mac), None)
+
+        # leases of sensors removed from our config
+        for mac in self.owned_macs() - self.macs:
+            self._send(self.lease_topic(mac), None)
+
+        return self.owned_macs() != before
+
+    def owned_macs(self) -> Set[str]:
+        now = self.clock()
+
+        with self._lock:
+            return {
+                mac
+                for mac, lease in self.leases.items()
+                if lease.get("host") == self.host and lease.get("expires", 0) > now
+            }
+
+    def owned(self, sensors: Iterable["DeviceConfig"]) -> Set["DeviceConfig"]:
+        """The given sensors this host holds the lease of."""
+        macs = self.owned_macs()
+        return {sensor for sensor in sensors if sensor.short_mac in macs}
+
+    def release(self) -> None:
+        """Give up all leases and leave the cluster, the other hosts take over right away."""
+        self.stop()
+
+        for mac in self.owned_macs():
+            self._send(self.lease_topic(mac), None)
+
+        self._send(self.heartbeat_topic, None)
+
+    def _send(self, topic: str, message: Optional[Dict[str, Any]]) -> None:
+        payload = json.dumps(message) if message is not None else ""
+
+        # applied right away, the broker echoes it back in order with the messages of the other hosts
+        self.handle(topic, payload.encode())
+        self.publish(topic, payload)
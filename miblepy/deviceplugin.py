@@ -1,8 +1,19 @@
+import time
+
 from abc import ABC, abstractmethod
-from typing import Any, Dict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+
+# seconds a plugin may take to fetch data before its worker process is killed
+FETCH_TIMEOUT = 30
 
 
 class MibleDevicePlugin(ABC):
+
+    # deadline for fetch_data, can be overridden per sensor with the `timeout` setting
+    fetch_timeout: float = FETCH_TIMEOUT
+
     def __init__(self, mac: str, interface: str, **kwargs: Any):
         self.mac = mac
         self.interface = interface
@@ -12,8 +23,21 @@ class MibleDevicePlugin(ABC):
         else:
             self.alias = mac
 
+        # seconds spent per phase of the last fetch (connect, read, notification, decode)
+        self.timings: Dict[str, float] = {}
+
         super().__init__()
 
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Measure the time spent in a phase of the fetch."""
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - started
+
     @property
     @abstractmethod
     def plugin_id(self) -> str:
@@ -32,3 +56,64 @@ class MibleDevicePlugin(ABC):
     @abstractmethod
     def fetch_data(self, **kwargs: Any) -> Dict[str, Any]:
         raise NotImplementedError
+
+
+class MibleAdvertisementPlugin(MibleDevicePlugin):
+    """Plugin that never connects but decodes the advertisements a device broadcasts.
+
+    Advertisements are collected in a scan window shared by all of these plugins and
+    handed to `handle_advertisement` for the plugins listening on the sending mac.
+    """
+
+    # seconds the scan window needs to be open to catch an advertisement
+    scan_timeout: float = 10
+
+    def __init__(self, mac: str, interface: str, **kwargs: Any):
+        self.data: Dict[str, Any] = {}
+
+        super().__init__(mac, interface, **kwargs)
+
+    @property
+    def done(self) -> bool:
+        """True once there is nothing more to wait for, the scan window closes early if all plugins are done."""
+        return False
+
+    @abstractmethod
+    def handle_advertisement(self, entry: Any, new_dev: bool, new_data: bool) -> None:
+        raise NotImplementedError
+
+    def published(self) -> None:
+        """Called once the broker acknowledged the published data, e.g. to remember it was sent."""
+
+    def fetch_data(self, **kwargs: Any) -> Dict[str, Any]:
+        """Scan on our own if we are not part of a shared scan window."""
+        from miblepy.scanner import AdvertisementScanner
+
+        scanner = AdvertisementScanner(self.interface)
+        scanner.add(self)
+        scanner.scan()
+
+        return self.data
+
+
+class MibleStreamingPlugin(MibleDevicePlugin):
+    """Plugin that can keep its connection open and receive every measurement the device pushes.
+
+    Used by `mible run` for sensors with `stream = true`: `subscribe` connects once, each
+    `listen` returns the data of the notifications received while waiting.
+    """
+
+    # seconds without a notification before the connection counts as dead and is reopened
+    stream_timeout: float = 60
+
+    @abstractmethod
+    def subscribe(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def listen(self, timeout: float) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def close(self) -> None:
+        raise NotImplementedError
@@ -2,21 +2,27 @@
 #   Mi Body Composition Scale 2 (XMTZC05HM)
 
 import logging
+import os
+import time
 
 from datetime import date, datetime
 from struct import unpack
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Optional, Union
 
 import miblepy.devices.xbm as xbm
 
-from bluepy.btle import BTLEDisconnectError, BTLEManagementError, DefaultDelegate, ScanEntry, Scanner
+from bluepy.btle import ScanEntry
 from miblepy import ATTRS
-from miblepy.deviceplugin import MibleDevicePlugin
+from miblepy.deviceplugin import MibleAdvertisementPlugin
+from miblepy.state import STATE_DIR, Journal
 
 
 PLUGIN_NAME = "BodyCompScale"
 
 SCAN_TIMEOUT = 10
+
+# seconds to wait for the impedance after a stabilized weight was seen
+GRACE_PERIOD = 3
 UNITS = {2: "kg", 3: "lbs"}
 DATA_KEYS = (
     "unit_id",
@@ -32,33 +38,39 @@ DATA_KEYS = (
 )
 
 
-class BodyCompScale(MibleDevicePlugin, DefaultDelegate):
+class BodyCompScale(MibleAdvertisementPlugin):
 
     plugin_id = "bodycompscale"
     plugin_name = "BodyCompScale"
     plugin_description = "suports the Mi Body Composition Scale 2 (XMTZC05HM) / Xiaomi Scale 2 (XMTZC02HM)"
 
+    scan_timeout = SCAN_TIMEOUT
+
     def __init__(self, mac: str, interface: str, **kwargs: Any):
         self.users: List[Dict[str, Union[str, int, float, date]]] = kwargs.get("users", [])
-        self.scanner: Scanner = None
-        self.data: Dict[str, Any] = {}
+        self.grace_period: float = kwargs.get("grace_period", GRACE_PERIOD)
 
-        super().__init__(mac, interface, **kwargs)
+        # published measurements by their timestamp, the scale repeats its last one for minutes
+        journal_path = kwargs.get("journal") or os.path.join(
+            kwargs.get("state_dir", STATE_DIR), f"{self.plugin_id}_{mac.replace(':', '')}.jsonl"
+        )
+        self.journal = Journal(journal_path, key=ATTRS.TIMESTAMP.value)
 
-    def fetch_data(self, **kwargs: Any) -> Dict[str, Any]:
-        """Get data from device."""
+        # journal record of the measurement in data, written once its publish was acknowledged
+        self.journal_record: Optional[Dict[str, Any]] = None
 
-        # attach notification handler
-        self.scanner = Scanner(iface=int(self.interface.replace("hci", ""))).withDelegate(self)
+        # when a stabilized measurement was first seen and if it had an impedance
+        self.stabilized_at: Optional[float] = None
+        self.complete = False
 
-        try:
-            self.scanner.scan(SCAN_TIMEOUT)
-        except BTLEDisconnectError as error:
-            logging.error(f"btle disconnected: {error}")
-        except BTLEManagementError as error:
-            logging.error(f"(temporary) bluetooth connection error: {error}")
+        super().__init__(mac, interface, **kwargs)
 
-        return self.data
+    @property
+    def done(self) -> bool:
+        if self.complete:
+            return True
+
+        return self.stabilized_at is not None and time.monotonic() - self.stabilized_at >= self.grace_period
 
     def get_age(self, birthdate: Any) -> int:
         today = date.today()
@@ -75,17 +87,15 @@ class BodyCompScale(MibleDevicePlugin, DefaultDelegate):
                 continue
 
             if user["weightOver"] < weight < user["weightBelow"]:  # type: ignore
-                # current user found, fill profile values and exit
-                current_user = user
-                current_user[ATTRS.WEIGHT.value] = weight
-                current_user[ATTRS.AGE.value] = self.get_age(current_user["birthdate"])
+                # current user found, fill profile values (of a copy, the users are shared config) and exit
+                current_user = {**user, ATTRS.WEIGHT.value: weight, ATTRS.AGE.value: self.get_age(user["birthdate"])}
                 break
 
         return current_user
 
-    def handleDiscovery(self, dev: ScanEntry, new_dev: bool, new_data: bool) -> None:
+    def handle_advertisement(self, dev: ScanEntry, new_dev: bool, new_data: bool) -> None:
 
-        if not dev.addr == self.mac.lower() or not new_dev or not new_data:
+        if not dev.addr == self.mac.lower() or not new_data:
             return
 
         for (sdid, _, data) in dev.getScanData():
@@ -129,6 +139,16 @@ class BodyCompScale(MibleDevicePlugin, DefaultDelegate):
                 measured["year"], measured["month"], measured["day"], measured["hour"], measured["min"], measured["sec"]
             )
 
+            self.stabilized_at = self.stabilized_at or time.monotonic()
+            self.complete = self.complete or bool(impedance_available)
+
+            # skip repeated measurements, unless the impedance was missing before
+            if (journaled := self.journal.get(measurement_datetime.isoformat())) and (
+                journaled.get(ATTRS.IMPEDANCE.value) or not impedance_available
+            ):
+                logging.debug(f"measurement of {measurement_datetime} already published")
+                continue
+
             # find the current user based on its weight
             if user := self.find_user(weight):
 
@@ -145,11 +165,11 @@ class BodyCompScale(MibleDevicePlugin, DefaultDelegate):
                     ATTRS.AGE.value: user[ATTRS.AGE.value],
                     ATTRS.SEX.value: user[ATTRS.SEX.value],
                     ATTRS.HEIGHT.value: user[ATTRS.HEIGHT.value],
-                    ATTRS.WEIGHT.value: f"{weight:.2f}",
+                    ATTRS.WEIGHT.value: round(weight, 2),
                     ATTRS.UNIT.value: unit,
-                    ATTRS.BASAL_METABOLISM.value: f"{bm.get_bmr():.2f}",
-                    ATTRS.VISCERAL_FAT.value: f"{bm.getVisceralFat():.2f}",
-                    ATTRS.BMI.value: f"{bm.getBMI():.2f}",
+                    ATTRS.BASAL_METABOLISM.value: round(bm.get_bmr(), 2),
+                    ATTRS.VISCERAL_FAT.value: round(bm.getVisceralFat(), 2),
+                    ATTRS.BMI.value: round(bm.getBMI(), 2),
                     ATTRS.TIMESTAMP.value: measurement_datetime.isoformat(),
                 }
 
@@ -157,12 +177,12 @@ class BodyCompScale(MibleDevicePlugin, DefaultDelegate):
                 if impedance_available:
                     attributes.update(
                         {
-                            ATTRS.WATER.value: f"{bm.getWaterPercentage():.2f}",
-                            ATTRS.BONE_MASS.value: f"{bm.getBoneMass():.2f}",
-                            ATTRS.BODY_FAT.value: f"{bm.getFatPercentage():.2f}",
-                            ATTRS.LEAN_BODY_MASS.value: f"{bm.get_lbm_coefficient():.2f}",
-                            ATTRS.MUSCLE_MASS.value: f"{bm.getMuscleMass():.2f}",
-                            ATTRS.PROTEIN.value: f"{bm.getProteinPercentage():.2f}",
+                            ATTRS.WATER.value: round(bm.getWaterPercentage(), 2),
+                            ATTRS.BONE_MASS.value: round(bm.getBoneMass(), 2),
+                            ATTRS.BODY_FAT.value: round(bm.getFatPercentage(), 2),
+                            ATTRS.LEAN_BODY_MASS.value: round(bm.get_lbm_coefficient(), 2),
+                            ATTRS.MUSCLE_MASS.value: round(bm.getMuscleMass(), 2),
+                            ATTRS.PROTEIN.value: round(bm.getProteinPercentage(), 2),
                         }
                     )
 
@@ -180,3 +200,17 @@ class BodyCompScale(MibleDevicePlugin, DefaultDelegate):
                         "attributes": attributes,
                     }
                 )
+
+                # in the format `mible recompute` reads
+                self.journal_record = {
+                    ATTRS.TIMESTAMP.value: measurement_datetime.isoformat(),
+                    ATTRS.WEIGHT.value: weight,
+                    ATTRS.IMPEDANCE.value: measured["impedance"] if impedance_available else None,
+                    ATTRS.USER.value: user[ATTRS.USER.value],
+                }
+
+    def published(self) -> None:
+        # a measurement lost on the way to the broker is published again when the scale repeats it
+        if self.journal_record:
+            self.journal.append(self.journal_record)
+            self.journal_record = None
@@ -1,11 +1,32 @@
+import time
+
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, List, Tuple
 
 from bluepy.btle import Peripheral
 from miblepy import ATTRS
 from miblepy.deviceplugin import MibleDevicePlugin
 
 
+# history log, see https://github.com/open-homeautomation/miflora
+HISTORY_CONTROL = 0x3E
+HISTORY_READ = 0x3C
+DEVICE_TIME = 0x41
+HISTORY_INIT = bytes([0xA0, 0x00, 0x00])
+HISTORY_INVALID = (
+    bytes([0xAA, 0xBB, 0xCC, 0xDD, 0xEE, 0xFF, 0x99, 0x88, 0x77, 0x66, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00]),
+    bytes([0x00] * 16),
+    bytes([0xFF] * 16),
+)
+
+# records read per fetch, the rest follows in the next ones. every record takes a write and a read,
+# so this keeps a backfill within the default fetch deadline
+HISTORY_MAX_RECORDS = 50
+
+# the device counts seconds since its boot, a boot time off by more than this means it rebooted
+EPOCH_TOLERANCE = 3600
+
+
 class FlowerCare(MibleDevicePlugin):
 
     plugin_id = "flowercare"
@@ -19,66 +40,137 @@ class FlowerCare(MibleDevicePlugin):
         """Get data from one Sensor."""
 
         # connect to device
-        peripheral = Peripheral(self.mac, iface=int(self.interface.replace("hci", "")))
-
-        # enable reading of values
-        peripheral.writeCharacteristic(0x33, bytes([0xA0, 0x1F]), withResponse=True)
-
-        # 7b in little endian
-        #    0: battery level
-        #    1: unknown
-        #  2-6: firmware version
-        battery_and_firmware: bytes = peripheral.readCharacteristic(0x38)
-        battery_level = int.from_bytes(battery_and_firmware[:1], byteorder="little")
-        firmware_version = str(battery_and_firmware[2:].decode("utf-8"))
-
-        # 16b in little endian
-        #   0-1: temperature in 0.1 °C
-        #     2: unknown
-        #   3-6: brightness in lux
-        #     7: moisture in %
-        #   8-9: conductivity in µS/cm
-        # 10-15: unknown
-        data: bytes = peripheral.readCharacteristic(0x35)
-
-        plugin_data: Dict[str, Any] = {
-            "name": self.plugin_name,
-            "sensors": [
-                {
-                    "name": f"{self.alias} {ATTRS.TEMPERATURE.value.capitalize()}",
-                    "value_template": "{{value_json." + ATTRS.TEMPERATURE.value + "}}",
-                    "entity_type": ATTRS.TEMPERATURE,
-                },
-                {
-                    "name": f"{self.alias} {ATTRS.BRIGHTNESS.value.capitalize()}",
-                    "value_template": "{{value_json." + ATTRS.BRIGHTNESS.value + "}}",
-                    "entity_type": ATTRS.BRIGHTNESS,
-                },
-                {
-                    "name": f"{self.alias} {ATTRS.MOISTURE.value.capitalize()}",
-                    "value_template": "{{value_json." + ATTRS.MOISTURE.value + "}}",
-                    "entity_type": ATTRS.MOISTURE,
-                },
-                {
-                    "name": f"{self.alias} {ATTRS.CONDUCTIVITY.value.capitalize()}",
-                    "value_template": "{{value_json." + ATTRS.CONDUCTIVITY.value + "}}",
-                    "entity_type": ATTRS.CONDUCTIVITY,
-                },
-                {
-                    "name": f"{self.alias} {ATTRS.BATTERY.value.capitalize()}",
-                    "value_template": "{{value_json." + ATTRS.BATTERY.value + "}}",
-                    "entity_type": ATTRS.BATTERY,
-                },
-            ],
-            "attributes": {
-                ATTRS.BATTERY.value: str(battery_level),
-                ATTRS.TEMPERATURE.value: str(int.from_bytes(data[0:2], byteorder="little") / 10),
-                ATTRS.BRIGHTNESS.value: str(int.from_bytes(data[3:6], byteorder="little")),
-                ATTRS.MOISTURE.value: str(int.from_bytes(data[7:8], byteorder="little")),
-                ATTRS.CONDUCTIVITY.value: str(int.from_bytes(data[8:10], byteorder="little")),
-                ATTRS.FW_VERSION.value: firmware_version,
-                ATTRS.TIMESTAMP.value: datetime.now().isoformat(),
-            },
-        }
+        with self.phase("connect"):
+            peripheral = Peripheral(self.mac, iface=int(self.interface.replace("hci", "")))
+
+        with self.phase("read"):
+            # enable reading of values
+            peripheral.writeCharacteristic(0x33, bytes([0xA0, 0x1F]), withResponse=True)
+
+            # 7b in little endian
+            #    0: battery level
+            #    1: unknown
+            #  2-6: firmware version
+            battery_and_firmware: bytes = peripheral.readCharacteristic(0x38)
+
+            # 16b in little endian
+            #   0-1: temperature in 0.1 °C
+            #     2: unknown
+            #   3-6: brightness in lux
+            #     7: moisture in %
+            #   8-9: conductivity in µS/cm
+            # 10-15: unknown
+            data: bytes = peripheral.readCharacteristic(0x35)
+
+        plugin_data = self.decode(battery_and_firmware, data)
+
+        if kwargs.get("history"):
+            plugin_data["history"], plugin_data["history_cursor"] = self.fetch_history(
+                peripheral,
+                kwargs.get("history_cursor") or {},
+                kwargs.get("history_max_records", HISTORY_MAX_RECORDS),
+            )
 
         return plugin_data
+
+    def fetch_history(
+        self, peripheral: Peripheral, cursor: Dict[str, Any], max_records: int
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Read the history records newer than the cursor."""
+        with self.phase("history"):
+            # boot time of the device, the record timestamps are seconds since then
+            device_time = int.from_bytes(peripheral.readCharacteristic(DEVICE_TIME)[:4], byteorder="little")
+            epoch = time.time() - device_time
+
+            peripheral.writeCharacteristic(HISTORY_CONTROL, HISTORY_INIT, withResponse=True)
+            count = int.from_bytes(peripheral.readCharacteristic(HISTORY_READ)[:2], byteorder="little")
+
+            start = cursor.get("records", 0)
+
+            # a cleared or rebooted device starts a new history
+            if start > count or abs(cursor.get("epoch", epoch) - epoch) > EPOCH_TOLERANCE:
+                start = 0
+
+            end = min(count, start + max_records)
+            records: List[Dict[str, Any]] = []
+
+            for index in range(start, end):
+                peripheral.writeCharacteristic(
+                    HISTORY_CONTROL, bytes([0xA1]) + index.to_bytes(2, byteorder="little"), withResponse=True
+                )
+
+                # 16b in little endian
+                #   0-3: timestamp in seconds since boot
+                #   4-5: temperature in 0.1 °C
+                #     6: unknown
+                #   7-9: brightness in lux
+                #    10: unknown
+                #    11: moisture in %
+                # 12-13: conductivity in µS/cm
+                # 14-15: unknown
+                record: bytes = peripheral.readCharacteristic(HISTORY_READ)
+
+                if record in HISTORY_INVALID:
+                    continue
+
+                record_time = epoch + int.from_bytes(record[0:4], byteorder="little")
+
+                records.append(
+                    {
+                        ATTRS.TEMPERATURE.value: int.from_bytes(record[4:6], byteorder="little", signed=True) / 10,
+                        ATTRS.BRIGHTNESS.value: int.from_bytes(record[7:10], byteorder="little"),
+                        ATTRS.MOISTURE.value: record[11],
+                        ATTRS.CONDUCTIVITY.value: int.from_bytes(record[12:14], byteorder="little"),
+                        ATTRS.TIMESTAMP.value: datetime.fromtimestamp(record_time).isoformat(),
+                    }
+                )
+
+        return records, {"records": end, "epoch": epoch}
+
+    def decode(self, battery_and_firmware: bytes, data: bytes) -> Dict[str, Any]:
+        """Build the plugin data from the raw characteristic values."""
+        with self.phase("decode"):
+            battery_level = int.from_bytes(battery_and_firmware[:1], byteorder="little")
+            firmware_version = str(battery_and_firmware[2:].decode("utf-8"))
+
+            plugin_data: Dict[str, Any] = {
+                "name": self.plugin_name,
+                "sensors": [
+                    {
+                        "name": f"{self.alias} {ATTRS.TEMPERATURE.value.capitalize()}",
+                        "value_template": "{{value_json." + ATTRS.TEMPERATURE.value + "}}",
+                        "entity_type": ATTRS.TEMPERATURE,
+                    },
+                    {
+                        "name": f"{self.alias} {ATTRS.BRIGHTNESS.value.capitalize()}",
+                        "value_template": "{{value_json." + ATTRS.BRIGHTNESS.value + "}}",
+                        "entity_type": ATTRS.BRIGHTNESS,
+                    },
+                    {
+                        "name": f"{self.alias} {ATTRS.MOISTURE.value.capitalize()}",
+                        "value_template": "{{value_json." + ATTRS.MOISTURE.value + "}}",
+                        "entity_type": ATTRS.MOISTURE,
+                    },
+                    {
+                        "name": f"{self.alias} {ATTRS.CONDUCTIVITY.value.capitalize()}",
+                        "value_template": "{{value_json." + ATTRS.CONDUCTIVITY.value + "}}",
+                        "entity_type": ATTRS.CONDUCTIVITY,
+                    },
+                    {
+                        "name": f"{self.alias} {ATTRS.BATTERY.value.capitalize()}",
+                        "value_template": "{{value_json." + ATTRS.BATTERY.value + "}}",
+                        "entity_type": ATTRS.BATTERY,
+                    },
+                ],
+                "attributes": {
+                    ATTRS.BATTERY.value: battery_level,
+                    ATTRS.TEMPERATURE.value: int.from_bytes(data[0:2], byteorder="little") / 10,
+                    ATTRS.BRIGHTNESS.value: int.from_bytes(data[3:6], byteorder="little"),
+                    ATTRS.MOISTURE.value: int.from_bytes(data[7:8], byteorder="little"),
+                    ATTRS.CONDUCTIVITY.value: int.from_bytes(data[8:10], byteorder="little"),
+                    ATTRS.FW_VERSION.value: firmware_version,
+                    ATTRS.TIMESTAMP.value: datetime.now().isoformat(),
+                },
+            }
+
+            return plugin_data
@@ -1,12 +1,33 @@
+import logging
+import struct
+import time
+
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 from bluepy.btle import DefaultDelegate, Peripheral
 from miblepy import ATTRS
-from miblepy.deviceplugin import MibleDevicePlugin
+from miblepy.deviceplugin import MibleStreamingPlugin
+
+
+# seconds to wait for the measurement notification
+NOTIFICATION_TIMEOUT = 10
+
+# history log, see https://github.com/JsBergbau/MiTemperature2
+UUID_TIME = "ebe0ccb7-7a0a-4b0c-8a1a-6ff2997da3a6"
+UUID_HISTORY = "ebe0ccbc-7a0a-4b0c-8a1a-6ff2997da3a6"
+UUID_RECORD_INDEX = "ebe0ccba-7a0a-4b0c-8a1a-6ff2997da3a6"
+UUID_RECORD_RANGE = "ebe0ccb9-7a0a-4b0c-8a1a-6ff2997da3a6"
+ENABLE_NOTIFICATIONS = bytes([0x01, 0x00])
+
+# seconds without a further history record before the transfer counts as done
+HISTORY_QUIET = 3
 
+# records read per fetch, the rest follows in the next ones
+HISTORY_MAX_RECORDS = 200
 
-class LYWSD03MMC(MibleDevicePlugin, DefaultDelegate):
+
+class LYWSD03MMC(MibleStreamingPlugin, DefaultDelegate):
 
     plugin_id = "lywsd03mmc"
     plugin_name = "LYWSD03MMC"
@@ -16,24 +37,117 @@ class LYWSD03MMC(MibleDevicePlugin, DefaultDelegate):
         self.peripheral: Peripheral = None
         self.data: Dict[str, Any] = {}
 
+        self.history_handle: int = 0
+        self.history: List[Dict[str, Any]] = []
+        self.clock_offset: float = 0
+
         super().__init__(mac, interface, **kwargs)
 
-    def fetch_data(self, **kwargs: Any) -> Dict[str, Any]:
+    def subscribe(self) -> None:
         # connect to device
-        self.peripheral = Peripheral(self.mac, iface=int(self.interface.replace("hci", "")))
+        with self.phase("connect"):
+            self.peripheral = Peripheral(self.mac, iface=int(self.interface.replace("hci", "")))
 
         # attach notification handler
         self.peripheral.setDelegate(self)
 
-        # safe power: https://github.com/JsBergbau/MiTemperature2/issues/18#issuecomment-590986874
-        self.peripheral.writeCharacteristic(0x46, bytes([0xF4, 0x01, 0x00]), withResponse=True)
+        with self.phase("read"):
+            # safe power: https://github.com/JsBergbau/MiTemperature2/issues/18#issuecomment-590986874
+            self.peripheral.writeCharacteristic(0x46, bytes([0xF4, 0x01, 0x00]), withResponse=True)
+
+    def listen(self, timeout: float) -> Dict[str, Any]:
+        # the device keeps sending a measurement every few seconds while connected
+        self.data = {}
+        self.peripheral.waitForNotifications(timeout)
 
-        if self.peripheral.waitForNotifications(10000):
+        return self.data
+
+    def close(self) -> None:
+        if self.peripheral:
             self.peripheral.disconnect()
+            self.peripheral = None
+
+    def fetch_data(self, **kwargs: Any) -> Dict[str, Any]:
+        try:
+            self.subscribe()
+
+            with self.phase("notification"):
+                self.peripheral.waitForNotifications(NOTIFICATION_TIMEOUT)
+
+            if self.data and kwargs.get("history"):
+                cursor = kwargs.get("history_cursor") or {}
+                self.fetch_history(cursor.get("index", 0), kwargs.get("history_max_records", HISTORY_MAX_RECORDS))
+
+                self.data["history"] = self.history
+                self.data["history_cursor"] = {"index": self.history[-1]["index"]} if self.history else cursor
+        finally:
+            # also without data or on errors, the connection would be kept by the adapter otherwise
+            self.close()
 
         return self.data
 
+    def fetch_history(self, index: int, max_records: int) -> None:
+        """Receive the hourly history records following the given record index."""
+        with self.phase("history"):
+            # seconds since epoch and timezone offset of the device clock
+            device_time, _ = struct.unpack("<Ib", self.peripheral.getCharacteristics(uuid=UUID_TIME)[0].read()[:5])
+            self.clock_offset = time.time() - device_time
+
+            # indices of the oldest and the newest record on the device
+            first, last = struct.unpack("<II", self.peripheral.getCharacteristics(uuid=UUID_RECORD_RANGE)[0].read()[:8])
+
+            # a reset device (e.g. after a battery swap) counts from the start again
+            if index > last:
+                logging.info(f"· {self.alias}: history restarted at record {first}, last one read was {index}")
+                index = first - 1
+
+            # start right after the last record we got
+            self.peripheral.getCharacteristics(uuid=UUID_RECORD_INDEX)[0].write(
+                struct.pack("<I", index + 1), withResponse=True
+            )
+
+            history = self.peripheral.getCharacteristics(uuid=UUID_HISTORY)[0]
+            self.history_handle = history.getHandle()
+
+            # client characteristic configuration descriptor follows the value handle
+            self.peripheral.writeCharacteristic(self.history_handle + 1, ENABLE_NOTIFICATIONS, withResponse=True)
+
+            while len(self.history) < max_records and self.peripheral.waitForNotifications(HISTORY_QUIET):
+                pass
+
+            # stop the transfer
+            self.peripheral.writeCharacteristic(self.history_handle + 1, bytes(2), withResponse=True)
+
+        self.history = self.history[:max_records]
+
+    def handle_history(self, data: bytes) -> None:
+        # 14b in little endian
+        #  0-3: record index
+        #  4-7: timestamp of the device clock
+        #  8-9: max temperature in 0.1 °C
+        #   10: max humidity in %
+        # 11-12: min temperature in 0.1 °C
+        #   13: min humidity in %
+        index, timestamp, temperature_max, humidity_max, temperature_min, humidity_min = struct.unpack(
+            "<IIhBhB", data[:14]
+        )
+
+        self.history.append(
+            {
+                "index": index,
+                f"{ATTRS.TEMPERATURE.value}_max": temperature_max / 10,
+                f"{ATTRS.TEMPERATURE.value}_min": temperature_min / 10,
+                f"{ATTRS.HUMIDITY.value}_max": humidity_max,
+                f"{ATTRS.HUMIDITY.value}_min": humidity_min,
+                ATTRS.TIMESTAMP.value: datetime.fromtimestamp(timestamp + self.clock_offset).isoformat(),
+            }
+        )
+
     def handleNotification(self, cHandle: int, data: bytes) -> None:
+        if self.history_handle and cHandle == self.history_handle:
+            self.handle_history(data)
+            return
+
         if cHandle != 0x36:
             return
 
@@ -58,12 +172,10 @@ class LYWSD03MMC(MibleDevicePlugin, DefaultDelegate):
                 "attributes": {
                     # 3.1 or above --> 100% 2.1 --> 0 %
                     ATTRS.BATTERY.value: min(int(round((voltage - 2.1), 2) * 100), 100),
-                    ATTRS.VOLTAGE.value: str(voltage),
-                    ATTRS.TEMPERATURE.value: str(int.from_bytes(data[0:2], byteorder="little", signed=True) / 100),
-                    ATTRS.HUMIDITY.value: str(int.from_bytes(data[2:3], byteorder="little")),
-                    ATTRS.TIMESTAMP.value: str(datetime.now().isoformat()),
+                    ATTRS.VOLTAGE.value: voltage,
+                    ATTRS.TEMPERATURE.value: int.from_bytes(data[0:2], byteorder="little", signed=True) / 100,
+                    ATTRS.HUMIDITY.value: int.from_bytes(data[2:3], byteorder="little"),
+                    ATTRS.TIMESTAMP.value: datetime.now().isoformat(),
                 },
             }
         )
-
-        self.peripheral.disconnect()
@@ -0,0 +1,124 @@
+# supported devices
+#   Xiaomi Mijia LYWSD03MMC running the custom firmware of atc1441 or pvvx
+#   https://github.com/atc1441/ATC_MiThermometer / https://github.com/pvvx/ATC_MiThermometer
+
+import logging
+
+from datetime import datetime
+from struct import unpack
+from typing import Any, Dict, Optional
+
+from bluepy.btle import ScanEntry
+from miblepy import ATTRS
+from miblepy.deviceplugin import MibleAdvertisementPlugin
+
+
+PLUGIN_NAME = "LYWSD03MMC"
+
+# the custom firmwares advertise every 2.5s (pvvx) to 10s (atc1441) by default
+SCAN_TIMEOUT = 10
+
+# environmental sensing service, little endian as in the service data
+SERVICE_DATA_UUID = "1a18"
+
+# service data without the uuid
+ATC1441_LENGTH = 13
+PVVX_LENGTH = 15
+
+
+def decode_atc1441(payload: bytes) -> Dict[str, Any]:
+    # 13b in big endian
+    #  0-5: mac
+    #  6-7: temperature in 0.1 °C
+    #    8: humidity in %
+    #    9: battery in %
+    # 10-11: battery in mV
+    #   12: frame counter
+    temperature, humidity, battery, voltage = unpack(">hBBH", payload[6:12])
+
+    return {
+        ATTRS.BATTERY.value: battery,
+        ATTRS.VOLTAGE.value: voltage / 1000,
+        ATTRS.TEMPERATURE.value: temperature / 10,
+        ATTRS.HUMIDITY.value: humidity,
+    }
+
+
+def decode_pvvx(payload: bytes) -> Dict[str, Any]:
+    # 15b in little endian
+    #  0-5: mac (reversed)
+    #  6-7: temperature in 0.01 °C
+    #  8-9: humidity in 0.01 %
+    # 10-11: battery in mV
+    #   12: battery in %
+    #   13: frame counter
+    #   14: flags
+    temperature, humidity, voltage, battery = unpack("<hHHB", payload[6:13])
+
+    return {
+        ATTRS.BATTERY.value: battery,
+        ATTRS.VOLTAGE.value: voltage / 1000,
+        ATTRS.TEMPERATURE.value: temperature / 100,
+        ATTRS.HUMIDITY.value: humidity / 100,
+    }
+
+
+DECODERS = {ATC1441_LENGTH: decode_atc1441, PVVX_LENGTH: decode_pvvx}
+
+
+class LYWSD03MMCAdv(MibleAdvertisementPlugin):
+
+    plugin_id = "lywsd03mmcadv"
+    plugin_name = "LYWSD03MMC (advertisements)"
+    plugin_description = "reads the LYWSD03MMC with atc1441/pvvx custom firmware from its advertisements"
+
+    scan_timeout = SCAN_TIMEOUT
+
+    def __init__(self, mac: str, interface: str, **kwargs: Any):
+        # last decoded service data, repeated frames are not decoded again
+        self.service_data: Optional[str] = None
+
+        super().__init__(mac, interface, **kwargs)
+
+    @property
+    def done(self) -> bool:
+        # every frame carries all values
+        return bool(self.data)
+
+    def handle_advertisement(self, dev: ScanEntry, new_dev: bool, new_data: bool) -> None:
+
+        for (sdid, _, data) in dev.getScanData():
+
+            # 16 bit service data with the environmental sensing uuid
+            if sdid != 22 or not data.startswith(SERVICE_DATA_UUID) or data == self.service_data:
+                continue
+
+            payload = bytes.fromhex(data[4:])
+
+            if not (decoder := DECODERS.get(len(payload))):
+                logging.debug(f"unknown advertisement format of {len(payload)} bytes: {data}")
+                continue
+
+            self.service_data = data
+
+            attributes = decoder(payload)
+            attributes[ATTRS.TIMESTAMP.value] = datetime.now().isoformat()
+
+            self.data.update(
+                {
+                    "name": PLUGIN_NAME,
+                    "sensors": [
+                        {
+                            "name": f"{self.alias} {ATTRS.TEMPERATURE.value.capitalize()}",
+                            "value_template": "{{value_json." + ATTRS.TEMPERATURE.value + "}}",
+                            "entity_type": ATTRS.TEMPERATURE,
+                        },
+                        {
+                            "name": f"{self.alias} {ATTRS.HUMIDITY.value.capitalize()}",
+                            "value_template": "{{value_json." + ATTRS.HUMIDITY.value + "}}",
+                            "entity_type": ATTRS.HUMIDITY,
+                        },
+                    ],
+                    "attributes": attributes,
+                }
+            )
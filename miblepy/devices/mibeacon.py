@@ -0,0 +1,239 @@
+# supported devices
+#   Xiaomi/Mijia sensors broadcasting MiBeacon (v4/v5) advertisements, encrypted with their bindkey or in plain
+#   e.g. LYWSD03MMC, MHO-C401, CGG1, LYWSDCGQ, HHCCJCY01 (FlowerCare)
+
+import logging
+import re
+
+from datetime import datetime
+from functools import lru_cache
+from struct import unpack_from
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from bluepy.btle import ScanEntry
+from miblepy import ATTRS
+from miblepy.deviceplugin import MibleAdvertisementPlugin
+
+
+PLUGIN_NAME = "MiBeacon"
+
+# most devices send every object type at least every few seconds, the battery less often
+SCAN_TIMEOUT = 10
+
+# xiaomi service data, little endian as in the service data
+SERVICE_DATA_UUID = "95fe"
+
+# frame control flags
+FLAG_ENCRYPTED = 0x08
+FLAG_MAC = 0x10
+FLAG_CAPABILITY = 0x20
+FLAG_OBJECT = 0x40
+CAPABILITY_IO = 0x20
+
+# encrypted payload trailer: 3 bytes extended frame counter and a 4 bytes message integrity check
+TRAILER_LENGTH = 7
+MIC_LENGTH = 4
+ASSOCIATED_DATA = b"\x11"
+
+# older counters than the last seen one are replays, unless the device restarted its counter
+REPLAY_WINDOW = 0x10000
+
+
+def _temperature(value: bytes) -> Dict[str, Any]:
+    return {ATTRS.TEMPERATURE.value: unpack_from("<h", value)[0] / 10}
+
+
+def _humidity(value: bytes) -> Dict[str, Any]:
+    return {ATTRS.HUMIDITY.value: unpack_from("<H", value)[0] / 10}
+
+
+def _battery(value: bytes) -> Dict[str, Any]:
+    return {ATTRS.BATTERY.value: value[0]}
+
+
+def _temperature_humidity(value: bytes) -> Dict[str, Any]:
+    temperature, humidity = unpack_from("<hH", value)
+    return {ATTRS.TEMPERATURE.value: temperature / 10, ATTRS.HUMIDITY.value: humidity / 10}
+
+
+def _brightness(value: bytes) -> Dict[str, Any]:
+    return {ATTRS.BRIGHTNESS.value: int.from_bytes(value[:3], byteorder="little")}
+
+
+def _moisture(value: bytes) -> Dict[str, Any]:
+    return {ATTRS.MOISTURE.value: value[0]}
+
+
+def _conductivity(value: bytes) -> Dict[str, Any]:
+    return {ATTRS.CONDUCTIVITY.value: unpack_from("<H", value)[0]}
+
+
+# object type -> (minimum length, decoder)
+OBJECTS: Dict[int, Tuple[int, Callable[[bytes], Dict[str, Any]]]] = {
+    0x1004: (2, _temperature),
+    0x1006: (2, _humidity),
+    0x1007: (3, _brightness),
+    0x1008: (1, _moisture),
+    0x1009: (2, _conductivity),
+    0x100A: (1, _battery),
+    0x100D: (4, _temperature_humidity),
+}
+
+# entities announced for the attributes a device sent
+ENTITIES = (ATTRS.TEMPERATURE, ATTRS.HUMIDITY, ATTRS.BRIGHTNESS, ATTRS.MOISTURE, ATTRS.CONDUCTIVITY, ATTRS.BATTERY)
+
+# (lowercase mac, encrypted) -> last frame counter, kept across scan windows
+_counters: Dict[Tuple[str, bool], int] = {}
+
+
+@lru_cache(maxsize=None)
+def get_cipher(bindkey: str) -> Any:
+    """AES-CCM context for a bindkey, built once per device."""
+    try:
+        from cryptography.hazmat.primitives.ciphers.aead import AESCCM
+    except ImportError:
+        logging.error("decrypting MiBeacon frames needs the 'cryptography' package: pip install miblepy[mibeacon]")
+        return None
+
+    return AESCCM(bytes.fromhex(bindkey), tag_length=MIC_LENGTH)
+
+
+def decode_objects(payload: bytes) -> Dict[str, Any]:
+    """Decode the (type, length, value) objects of a frame into attributes."""
+    attributes: Dict[str, Any] = {}
+    position = 0
+
+    while position + 3 <= len(payload):
+        object_type, length = unpack_from("<HB", payload, position)
+        value = payload[position + 3 : position + 3 + length]
+        position += 3 + length
+
+        if (known := OBJECTS.get(object_type)) and len(value) >= known[0]:
+            attributes.update(known[1](value))
+
+    return attributes
+
+
+class MiBeacon(MibleAdvertisementPlugin):
+
+    plugin_id = "mibeacon"
+    plugin_name = "MiBeacon"
+    plugin_description = "decodes the (encrypted) MiBeacon advertisements of Xiaomi sensors"
+
+    scan_timeout = SCAN_TIMEOUT
+
+    def __init__(self, mac: str, interface: str, **kwargs: Any):
+        self.bindkey: Optional[str] = kwargs.get("bindkey")
+
+        if self.bindkey and not re.fullmatch(r"[0-9a-fA-F]{32}", self.bindkey):
+            logging.error(f"· {kwargs.get('alias', mac)}: bindkey has to be 32 hex characters, ignoring it")
+            self.bindkey = None
+
+        # the mac as sent in the frames, reversed
+        self.mac_reversed = bytes.fromhex(mac.replace(":", ""))[::-1]
+
+        super().__init__(mac, interface, **kwargs)
+
+    def handle_advertisement(self, dev: ScanEntry, new_dev: bool, new_data: bool) -> None:
+
+        for (sdid, _, data) in dev.getScanData():
+
+            if sdid != 22 or not data.startswith(SERVICE_DATA_UUID):
+                continue
+
+            if attributes := self.decode(bytes.fromhex(data[4:])):
+                self.update(attributes)
+
+    def decode(self, frame: bytes) -> Dict[str, Any]:
+        """Attributes of a MiBeacon frame, empty for replayed or undecodable frames."""
+        #   0-1: frame control
+        #   2-3: device (product) id
+        #     4: frame counter
+        #   5-10: mac (reversed), if flagged
+        #     11: capability, if flagged (+2 io capability)
+        #   ...: objects, encrypted if flagged
+        if len(frame) < 5:
+            return {}
+
+        frame_control, _ = unpack_from("<HH", frame)
+        position = 5
+
+        if not frame_control & FLAG_OBJECT:
+            return {}
+
+        if frame_control & FLAG_MAC:
+            position += 6
+
+        if frame_control & FLAG_CAPABILITY and position < len(frame):
+            position += 3 if frame[position] & CAPABILITY_IO else 1
+
+        if not frame_control & FLAG_ENCRYPTED:
+            # the same frame is repeated until the next measurement
+            if self._replayed(frame[4], encrypted=False):
+                return {}
+
+            _counters[(self.mac.lower(), False)] = frame[4]
+
+            return decode_objects(frame[position:])
+
+        if (frame_control >> 12) < 4:
+            logging.debug(f"· {self.alias}: legacy MiBeacon encryption (v{frame_control >> 12}) is not supported")
+            return {}
+
+        if not self.bindkey:
+            logging.debug(f"· {self.alias}: encrypted MiBeacon frame but no bindkey configured")
+            return {}
+
+        if len(frame) < position + TRAILER_LENGTH:
+            return {}
+
+        trailer = frame[-TRAILER_LENGTH:]
+        counter = int.from_bytes(bytes([frame[4]]) + trailer[:3], byteorder="little")
+
+        # checked before decrypting, replays are dropped without touching the cipher
+        if self._replayed(counter, encrypted=True) or not (cipher := get_cipher(self.bindkey)):
+            return {}
+
+        # nonce: mac (reversed), device id, frame counter and extended frame counter
+        nonce = self.mac_reversed + frame[2:5] + trailer[:3]
+
+        try:
+            payload = cipher.decrypt(nonce, frame[position:-TRAILER_LENGTH] + trailer[3:], ASSOCIATED_DATA)
+        except Exception as error:  # pylint: disable=broad-except
+            logging.debug(f"· {self.alias}: could not decrypt MiBeacon frame: {error.__class__.__name__}")
+            return {}
+
+        # only authenticated frames move the counter
+        _counters[(self.mac.lower(), True)] = counter
+
+        return decode_objects(payload)
+
+    def _replayed(self, counter: int, encrypted: bool) -> bool:
+        if (last := _counters.get((self.mac.lower(), encrypted))) is None:
+            return False
+
+        if not encrypted:
+            return counter == last
+
+        return last - REPLAY_WINDOW < counter <= last
+
+    def update(self, attributes: Dict[str, Any]) -> None:
+        # every frame carries one or two values, they add up over the scan window
+        attributes = {**self.data.get("attributes", {}), **attributes}
+        attributes[ATTRS.TIMESTAMP.value] = datetime.now().isoformat()
+
+        self.data.update(
+            {
+                "name": PLUGIN_NAME,
+                "sensors": [
+                    {
+                        "name": f"{self.alias} {entity.value.capitalize()}",
+                        "value_template": "{{value_json." + entity.value + "}}",
+                        "entity_type": entity,
+                    }
+                    for entity in ENTITIES
+                    if entity.value in attributes
+                ],
+                "attributes": attributes,
+            }
+        )
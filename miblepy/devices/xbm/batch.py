@@ -0,0 +1,232 @@
+"""Body metrics for many measurements at once.
+
+Same formulas, branches and capping as `BodyMetrics`, but every intermediate value
+is computed once and whole columns of measurements are processed in one pass.
+numpy is used if available, otherwise the rows are computed one by one.
+"""
+
+import logging
+
+from datetime import date, datetime
+from math import floor, isnan, nan
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+from miblepy import ATTRS
+from miblepy.devices.xbm import LIMIT_AGE, LIMIT_HEIGHT, LIMIT_WEIGHT
+
+
+# metrics which need a valid impedance
+IMPEDANCE_METRICS = (
+    ATTRS.WATER.value,
+    ATTRS.BONE_MASS.value,
+    ATTRS.BODY_FAT.value,
+    ATTRS.LEAN_BODY_MASS.value,
+    ATTRS.MUSCLE_MASS.value,
+    ATTRS.PROTEIN.value,
+)
+METRICS = (ATTRS.BASAL_METABOLISM.value, ATTRS.VISCERAL_FAT.value, ATTRS.BMI.value) + IMPEDANCE_METRICS
+
+
+class _Scalar:
+    """Array operations on single values, used for the row by row computation."""
+
+    @staticmethod
+    def where(condition: bool, value: float, other: float) -> float:
+        return value if condition else other
+
+    @staticmethod
+    def clip(value: float, minimum: float, maximum: float) -> float:
+        return minimum if value < minimum else maximum if value > maximum else value
+
+    floor = staticmethod(floor)
+
+
+def _metrics(weight: Any, height: Any, age: Any, female: Any, impedance: Any, xp: Any) -> Dict[str, Any]:
+    """All metrics for values or arrays of values, `xp` provides where/clip/floor."""
+    male = ~female if xp is not _Scalar else not female
+
+    # lean body mass coefficient
+    lbm = (height * 9.058 / 100) * (height / 100)
+    lbm = lbm + (weight * 0.32 + 12.226)
+    lbm = lbm - impedance * 0.0068
+    lbm = lbm - age * 0.0542
+
+    # basal metabolism
+    bmr_female = 864.6 + weight * 10.2036
+    bmr_female = bmr_female - height * 0.39336
+    bmr_female = bmr_female - age * 6.204
+    bmr_female = xp.where(bmr_female <= 2996, bmr_female, 5000)
+    bmr_male = 877.8 + weight * 14.916
+    bmr_male = bmr_male - height * 0.726
+    bmr_male = bmr_male - age * 8.976
+    bmr_male = xp.where(bmr_male <= 2322, bmr_male, 5000)
+    bmr = xp.clip(xp.where(female, bmr_female, bmr_male), 500, 10000)
+
+    # fat percentage
+    const = xp.where(female, xp.where(age <= 49, 9.25, 7.25), 0.8)
+    taller = xp.where(height > 160, 1.03, 1.0)
+    coefficient = xp.where(
+        male,
+        xp.where(weight < 61, 0.98, 1.0),
+        xp.where(weight > 60, 0.96 * taller, xp.where(weight < 50, 1.02 * taller, 1.0)),
+    )
+    fat = (1.0 - (((lbm - const) * coefficient) / weight)) * 100
+    fat = xp.clip(xp.where(fat > 63, 75, fat), 5, 75)
+
+    # water percentage
+    water = (100 - fat) * 0.7
+    water_coefficient = xp.where(water <= 50, 1.02, 0.98)
+    water = xp.where(water * water_coefficient >= 65, 75, water)
+    water = xp.clip(water * water_coefficient, 35, 75)
+
+    # bone mass
+    bone = (xp.where(female, 0.245691014, 0.18016894) - (lbm * 0.05158)) * -1
+    bone = xp.where(bone > 2.2, bone + 0.1, bone - 0.1)
+    bone = xp.where(xp.where(female, bone > 5.1, bone > 5.2), 8, bone)
+    bone = xp.clip(bone, 0.5, 8)
+
+    # muscle mass
+    muscle = weight - ((fat * 0.01) * weight) - bone
+    muscle = xp.where(xp.where(female, muscle >= 84, muscle >= 93.5), 120, muscle)
+    muscle = xp.clip(muscle, 10, 120)
+
+    # visceral fat
+    female_heavy = ((height * 1.45) + (height * 0.1158) * height) - 120
+    female_heavy = ((weight * 500 / female_heavy) - 6) + (age * 0.07)
+    female_light = 0.691 + (height * -0.0024) + (height * -0.0024)
+    female_light = (((height * 0.027) - (female_light * weight)) * -1) + (age * 0.07) - age
+    male_heavy = ((height * 0.4) - (height * (height * 0.0826))) * -1
+    male_heavy = ((weight * 305) / (male_heavy + 48)) - 2.9 + (age * 0.15)
+    male_light = 0.765 + height * -0.0015
+    male_light = (((height * 0.143) - (weight * male_light)) * -1) + (age * 0.15) - 5.0
+    visceral = xp.where(
+        female,
+        xp.where(weight > (13 - (height * 0.5)) * -1, female_heavy, female_light),
+        xp.where(height < weight * 1.6, male_heavy, male_light),
+    )
+    visceral = xp.clip(visceral, 1, 50)
+
+    # protein percentage (guessed formula)
+    protein = 100 - (xp.floor(fat * 100) / 100)
+    protein = protein - xp.floor(water * 100) / 100
+    protein = protein - xp.floor((bone / weight * 100) * 100) / 100
+
+    return {
+        ATTRS.BASAL_METABOLISM.value: bmr,
+        ATTRS.VISCERAL_FAT.value: visceral,
+        ATTRS.BMI.value: xp.clip(weight / ((height / 100) * (height / 100)), 10, 90),
+        ATTRS.WATER.value: water,
+        ATTRS.BONE_MASS.value: bone,
+        ATTRS.BODY_FAT.value: fat,
+        ATTRS.LEAN_BODY_MASS.value: lbm,
+        ATTRS.MUSCLE_MASS.value: muscle,
+        ATTRS.PROTEIN.value: protein,
+    }
+
+
+def valid(weight: float, height: float, age: float, sex: str) -> bool:
+    """Check a measurement against the limits `BodyMetrics` enforces."""
+    return height <= LIMIT_HEIGHT and 1 <= weight <= LIMIT_WEIGHT and age <= LIMIT_AGE and sex in ("female", "male")
+
+
+def _calculate_rows(
+    weight: Sequence[float],
+    height: Sequence[float],
+    age: Sequence[float],
+    sex: Sequence[str],
+    impedance: Sequence[int],
+    valid_rows: Sequence[bool],
+) -> Dict[str, List[float]]:
+    """Every metric row by row, without numpy."""
+    results: Dict[str, List[float]] = {}
+
+    for index, is_valid in enumerate(valid_rows):
+        row = (
+            _metrics(weight[index], height[index], age[index], sex[index] == "female", impedance[index], _Scalar)
+            if is_valid
+            else dict.fromkeys(METRICS, nan)
+        )
+        for key, value in row.items():
+            results.setdefault(key, []).append(value)
+
+    return results
+
+
+def calculate(
+    weight: Sequence[float],
+    height: Sequence[float],
+    age: Sequence[float],
+    sex: Sequence[str],
+    impedance: Sequence[int],
+) -> Dict[str, List[float]]:
+    """Every metric for columns of measurements, nan for rows out of bounds."""
+    valid_rows = [valid(*row) for row in zip(weight, height, age, sex)]
+
+    try:
+        import numpy as np
+    except ImportError:
+        return _calculate_rows(weight, height, age, sex, impedance, valid_rows)
+
+    mask = np.asarray(valid_rows, dtype=bool)
+
+    # rows out of bounds are computed with harmless values and blanked afterwards
+    columns = [np.where(mask, np.asarray(column, dtype=float), 100.0) for column in (weight, height, age, impedance)]
+    female = np.asarray(sex) == "female"
+
+    with np.errstate(all="ignore"):
+        metrics = _metrics(columns[0], columns[1], columns[2], female, columns[3], np)
+
+    return {key: np.where(mask, value, nan).tolist() for key, value in metrics.items()}
+
+
+def age_at(birthdate: date, day: date) -> int:
+    """Age in years at the given day."""
+    return int(day.year - birthdate.year - ((day.month, day.day) < (birthdate.month, birthdate.day)))
+
+
+def recompute(records: Iterable[Dict[str, Any]], users: Dict[str, Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Recompute the metrics of stored measurements with the current user profiles.
+
+    Records need `weight`, `timestamp` and `user`, `impedance` is optional. Records of
+    unknown users are skipped.
+    """
+    known: List[Dict[str, Any]] = []
+
+    for record in records:
+        if record.get(ATTRS.USER.value) not in users:
+            logging.warning(f"no profile for user {record.get(ATTRS.USER.value)!r}, skipping {record}")
+            continue
+
+        known.append(record)
+
+    weight: List[float] = []
+    height: List[float] = []
+    age: List[float] = []
+    sex: List[str] = []
+    impedance: List[int] = []
+
+    for record in known:
+        user = users[record[ATTRS.USER.value]]
+        measured = datetime.fromisoformat(record[ATTRS.TIMESTAMP.value]).date()
+
+        weight.append(float(record[ATTRS.WEIGHT.value]))
+        height.append(user[ATTRS.HEIGHT.value])
+        age.append(age_at(user["birthdate"], measured))
+        sex.append(user[ATTRS.SEX.value])
+        impedance.append(int(record.get(ATTRS.IMPEDANCE.value) or 0))
+
+    metrics = calculate(weight, height, age, sex, impedance)
+
+    for index, record in enumerate(known):
+        row: Dict[str, float] = {key: values[index] for key, values in metrics.items()}
+
+        if not impedance[index]:
+            row = {key: value for key, value in row.items() if key not in IMPEDANCE_METRICS}
+
+        yield {
+            **record,
+            ATTRS.AGE.value: age[index],
+            ATTRS.HEIGHT.value: height[index],
+            ATTRS.SEX.value: sex[index],
+            **{key: None if isnan(value) else round(value, 2) for key, value in row.items()},
+        }
@@ -0,0 +1,237 @@
+import logging
+import threading
+import time
+
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    from http.server import ThreadingHTTPServer
+
+
+# seconds, from a quick characteristic read to a hung connect
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# seconds an ack waits for its publish to be timed, acks of messages published without timing never get one
+ACK_MAX_AGE = 10.0
+
+# seconds a timed publish waits for its ack, e.g. messages lost with the connection are never acknowledged
+SENT_MAX_AGE = 300.0
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    labels = [f'{name}="{value}"' for name, value in zip(names, escaped)]
+
+    if extra:
+        labels.append(extra)
+
+    return f"{{{','.join(labels)}}}" if labels else ""
+
+
+class Counter:
+    """Monotonically increasing value per label set."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+        self.values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in sorted(self.values.items())
+            ]
+
+    def samples(self) -> Dict[str, float]:
+        with self._lock:
+            return {f"{self.name}{_format_labels(self.labels, key)}": value for key, value in self.values.items()}
+
+
+class Histogram:
+    """Distribution of observed values per label set."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+
+        # label values -> (bucket counts, sum, count)
+        self.values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+
+        with self._lock:
+            bucket_counts, total, count = self.values.get(key, ([0] * len(self.buckets), 0.0, 0))
+
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    bucket_counts[index] += 1
+
+            self.values[key] = (bucket_counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = []
+
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self.values.items()):
+                for bound, bucket_count in [*zip(self.buckets, bucket_counts), ("+Inf", count)]:
+                    bucket_labels = _format_labels(self.labels, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{bucket_labels} {bucket_count}")
+
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+
+        return lines
+
+    def samples(self) -> Dict[str, float]:
+        with self._lock:
+            samples: Dict[str, float] = {}
+
+            for key, (_, total, count) in self.values.items():
+                samples[f"{self.name}_sum{_format_labels(self.labels, key)}"] = round(total, 6)
+                samples[f"{self.name}_count{_format_labels(self.labels, key)}"] = count
+
+            return samples
+
+
+PHASE_SECONDS = Histogram(
+    "miblepy_phase_seconds",
+    "duration of the fetch phases (connect, read, notification, decode) and publish-to-ack",
+    ["phase", "plugin", "sensor"],
+)
+SCAN_SECONDS = Histogram("miblepy_scan_window_seconds", "duration of the shared advertisement scan window")
+CYCLE_SECONDS = Histogram("miblepy_cycle_seconds", "duration of a fetch cycle over all due sensors")
+FETCHES = Counter("miblepy_fetches_total", "fetches by result", ["plugin", "sensor", "result"])
+MESSAGES = Counter("miblepy_messages_total", "messages published", ["kind"])
+NOTIFICATIONS = Counter("miblepy_stream_notifications_total", "measurements received on open streams", ["sensor"])
+RECONNECTS = Counter(
+    "miblepy_stream_reconnects_total", "streams reopened after a dropped or silent connection", ["sensor"]
+)
+UNCHANGED = Counter(
+    "miblepy_unchanged_total", "state messages not sent as nothing changed beyond the deadbands", ["sensor"]
+)
+
+METRICS: List[Any] = [
+    PHASE_SECONDS,
+    SCAN_SECONDS,
+    CYCLE_SECONDS,
+    FETCHES,
+    MESSAGES,
+    NOTIFICATIONS,
+    RECONNECTS,
+    UNCHANGED,
+]
+
+
+def render() -> str:
+    """All metrics in the prometheus text format."""
+    lines = []
+
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.render())
+
+    return "\n".join(lines) + "\n"
+
+
+def samples() -> Dict[str, float]:
+    """Counters and histogram sums/counts by their sample name."""
+    return {name: value for metric in METRICS for name, value in metric.samples().items()}
+
+
+class AckTimer:
+    """Measures the publish-to-ack latency by message id, no matter if publish or ack is seen first.
+
+    Only messages passed to `sent()` are timed. Acks without a timed publish and
+    publishes without an ack expire, so neither map grows and message ids reused
+    by the client do not match stale entries.
+    """
+
+    def __init__(self) -> None:
+        self._sent: Dict[int, Tuple[float, Dict[str, str]]] = {}
+        self._acked: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        # both maps are in the order of their timestamps, the oldest entries come first
+        while self._acked and now - next(iter(self._acked.values())) > ACK_MAX_AGE:
+            del self._acked[next(iter(self._acked))]
+
+        while self._sent and now - next(iter(self._sent.values()))[0] > SENT_MAX_AGE:
+            del self._sent[next(iter(self._sent))]
+
+    def sent(self, mid: int, started: float, labels: Dict[str, str]) -> None:
+        with self._lock:
+            self._expire(time.perf_counter())
+
+            if (acked := self._acked.pop(mid, None)) is None:
+                self._sent[mid] = (started, labels)
+                return
+
+        PHASE_SECONDS.observe(acked - started, phase="publish", **labels)
+
+    def acked(self, mid: int) -> None:
+        now = time.perf_counter()
+
+        with self._lock:
+            self._expire(now)
+
+            if (sent := self._sent.pop(mid, None)) is None:
+                self._acked[mid] = now
+                return
+
+        started, labels = sent
+        PHASE_SECONDS.observe(now - started, phase="publish", **labels)
+
+
+def start_server(address: str, port: int) -> Optional["ThreadingHTTPServer"]:
+    """Serve the metrics on http://address:port/metrics in a background thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # pylint: disable=invalid-name
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+
+            body = render().encode()
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=redefined-builtin
+            logging.debug(f"metrics: {format % args}")
+
+    try:
+        server = ThreadingHTTPServer((address, port), MetricsHandler)
+    except OSError as error:
+        logging.error(f"could not start metrics endpoint on {address}:{port}: {error}")
+        return None
+
+    threading.Thread(target=server.serve_forever, name="miblepy-metrics", daemon=True).start()
+    logging.info(f"metrics available at http://{address}:{port}/metrics")
+
+    return server
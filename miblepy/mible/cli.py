@@ -1,8 +1,21 @@
 #!/usr/bin/env python3
 
+import json
+
+from typing import TextIO
+
 import click
 
-from miblepy import CONFIG_FILE, MAX_RETRIES, Miblepy, __name__ as mbp_name, __version__ as mbp_version, get_plugins, hl
+from miblepy import (
+    CONFIG_FILE,
+    MAX_RETRIES,
+    Configuration,
+    Miblepy,
+    __name__ as mbp_name,
+    __version__ as mbp_version,
+    hl,
+)
+from miblepy.registry import get_registry
 
 
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
@@ -43,7 +56,105 @@ def cli(ctx: click.Context, version: bool, verbose: bool, debug: bool) -> None:
     "-r", "--retries", default=MAX_RETRIES, type=int, help="times we try to get data from a sensor",
 )
 def fetch(ctx: click.Context, config: str, retries: int) -> None:
-    Miblepy(config_file_path=config, retries=retries, verbose=ctx.obj["verbose"], debug=ctx.obj["debug"]).go()
+    mible = Miblepy(config_file_path=config, retries=retries, verbose=ctx.obj["verbose"], debug=ctx.obj["debug"])
+
+    # stop the fetch workers and disconnect cleanly. the cluster heartbeat and leases stay until they expire,
+    # the next fetch from the timer renews them before the other hosts take over
+    try:
+        mible.go()
+    finally:
+        mible.shutdown(release=False)
+
+
+@cli.command()
+@click.pass_context
+@click.option(
+    "-c", "--config", default=CONFIG_FILE, type=click.Path(file_okay=True), required=False, help="path to config file",
+)
+@click.option(
+    "-r", "--retries", default=MAX_RETRIES, type=int, help="times we try to get data from a sensor",
+)
+def run(ctx: click.Context, config: str, retries: int) -> None:
+    """keep running and fetch every sensor on its own interval"""
+    Miblepy(config_file_path=config, retries=retries, verbose=ctx.obj["verbose"], debug=ctx.obj["debug"]).run()
+
+
+@cli.command()
+@click.pass_context
+@click.argument("capture", type=click.Path(dir_okay=False))
+@click.option(
+    "-c", "--config", default=CONFIG_FILE, type=click.Path(file_okay=True), required=False, help="path to config file",
+)
+@click.option("-n", "--rounds", default=1, type=int, help="fetch rounds to record")
+def record(ctx: click.Context, capture: str, config: str, rounds: int) -> None:
+    """fetch as usual and append the bluetooth traffic to a capture file"""
+    from miblepy.replay import record as record_traffic
+
+    mible = Miblepy(config_file_path=config, verbose=ctx.obj["verbose"], debug=ctx.obj["debug"])
+    # the traffic of worker processes is not seen here
+    mible.config.isolate = False
+
+    recorder = record_traffic(capture)
+
+    try:
+        for _ in range(rounds):
+            mible.go()
+    finally:
+        recorder.close()
+        mible.shutdown()
+
+
+@cli.command()
+@click.pass_context
+@click.argument("capture", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "-c", "--config", default=CONFIG_FILE, type=click.Path(file_okay=True), required=False, help="path to config file",
+)
+@click.option("-n", "--rounds", default=1, type=int, help="fetch rounds to replay")
+@click.option(
+    "-s", "--speed", default="max", type=click.Choice(["real", "max"]), help="recorded pace or as fast as possible"
+)
+def replay(ctx: click.Context, capture: str, config: str, rounds: int, speed: str) -> None:
+    """fetch from a capture file instead of the bluetooth adapters"""
+    from miblepy.replay import replay as replay_traffic
+
+    mible = Miblepy(config_file_path=config, verbose=ctx.obj["verbose"], debug=ctx.obj["debug"])
+    mible.config.isolate = False
+
+    replay_traffic(capture, speed)
+
+    try:
+        for _ in range(rounds):
+            mible.go()
+    finally:
+        mible.shutdown()
+
+
+@cli.command()
+@click.pass_context
+@click.argument("history", type=click.File("r"))
+@click.option(
+    "-c", "--config", default=CONFIG_FILE, type=click.Path(file_okay=True), required=False, help="path to config file",
+)
+@click.option("-o", "--output", default="-", type=click.File("w"), help="file for the recomputed measurements")
+def recompute(ctx: click.Context, history: TextIO, config: str, output: TextIO) -> None:
+    """recompute the body metrics of stored scale measurements (json lines) with the current user profiles"""
+    from miblepy.devices.xbm.batch import recompute as recompute_metrics
+
+    users = {
+        user["user"]: user
+        for sensor in Configuration(config, verbose=ctx.obj["verbose"], debug=ctx.obj["debug"]).sensors
+        if sensor.device_type == "bodycompscale"
+        for user in sensor.config.get("users", [])
+    }
+
+    records = (json.loads(line) for line in history if line.strip())
+    count = 0
+
+    for count, record in enumerate(recompute_metrics(records, users), start=1):
+        output.write(json.dumps(record) + "\n")
+
+    click.echo(f"recomputed {hl(count)} measurements", err=True)
 
 
 @cli.command()
@@ -52,8 +163,12 @@ def plugins(ctx: click.Context) -> None:
     click.echo(version_message)
     click.echo()
 
-    for plugin_id, plugin in get_plugins().items():
-        click.echo(f"{hl(plugin['class'].plugin_name):>24} · {plugin['class'].plugin_description}")
+    registry = get_registry()
+
+    # read from the plugin sources, importing every device module would pull in the bluetooth stack
+    for plugin_id in registry.ids:
+        if description := registry.describe(plugin_id):
+            click.echo(f"{hl(description[0]):>24} · {description[1]}")
 
 
 if __name__ == "__main__":
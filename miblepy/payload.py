@@ -0,0 +1,55 @@
+"""Encode the state and history messages of the sensors.
+
+JSON by default, or CBOR / MessagePack for compact binary messages. The binary
+formats need the optional `cbor2` or `msgpack` package, which are imported on
+first use. Discovery configs stay JSON as Home Assistant expects them.
+"""
+
+import json
+import logging
+
+from typing import Any, Callable, Dict, Union
+
+
+FORMATS = ("json", "cbor", "msgpack")
+
+# package providing a format and the extra installing it
+PACKAGES = {"cbor": ("cbor2", "cbor"), "msgpack": ("msgpack", "msgpack")}
+
+Payload = Union[str, bytes]
+
+
+def check_format(payload_format: Any) -> str:
+    """The given payload format if it is known and its package installed, json otherwise."""
+    if payload_format not in FORMATS:
+        logging.error(f"unknown payload format {payload_format!r}, one of {', '.join(FORMATS)} expected, using json")
+        return "json"
+
+    if payload_format in PACKAGES:
+        try:
+            encoder(payload_format)
+        except ImportError:
+            package, extra = PACKAGES[payload_format]
+            logging.error(f"{payload_format} payloads need the '{package}' package: pip install miblepy[{extra}]")
+            return "json"
+
+    return str(payload_format)
+
+
+def encoder(payload_format: str) -> Callable[[Dict[str, Any]], Payload]:
+    """Function encoding a message in the given format."""
+    if payload_format == "cbor":
+        import cbor2
+
+        return cbor2.dumps
+
+    if payload_format == "msgpack":
+        import msgpack
+
+        return msgpack.packb
+
+    return json.dumps
+
+
+def encode(data: Dict[str, Any], payload_format: str = "json") -> Payload:
+    return encoder(payload_format)(data)
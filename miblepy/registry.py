@@ -0,0 +1,173 @@
+import ast
+import importlib
+import importlib.util
+import logging
+import os
+import pkgutil
+
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from miblepy.deviceplugin import MibleDevicePlugin
+
+
+# third-party plugins register themselves in this entry point group, e.g.
+#   [tool.poetry.plugins."miblepy.plugins"]
+#   mydevice = "mypackage.mydevice:MyDevice"
+ENTRY_POINT_GROUP = "miblepy.plugins"
+
+BUILTIN_PACKAGE = "miblepy.devices"
+
+
+class PluginRegistry:
+    """Known device plugins by plugin_id, imported on first use."""
+
+    def __init__(self) -> None:
+        # plugin_id -> "module" or "module:Class"
+        self.sources: Dict[str, str] = {}
+
+        self._plugins: Dict[str, Dict[str, Any]] = {}
+        self._failed: Set[str] = set()
+
+        self._discover_builtin()
+        self._discover_entry_points()
+
+    def _discover_builtin(self) -> None:
+        """Collect the bundled plugins without importing them."""
+        plugin_path = os.path.join(os.path.dirname(__file__), "devices")
+
+        for _, mod_name, _ in pkgutil.iter_modules(path=[plugin_path]):
+            self.sources[mod_name] = f"{BUILTIN_PACKAGE}.{mod_name}"
+
+    def _discover_entry_points(self) -> None:
+        """Collect third-party plugins registered via entry points."""
+        try:
+            from importlib.metadata import entry_points
+        except ImportError:  # pragma: no cover
+            return
+
+        all_entry_points = entry_points()
+
+        if hasattr(all_entry_points, "select"):
+            group = all_entry_points.select(group=ENTRY_POINT_GROUP)
+        else:
+            group = all_entry_points.get(ENTRY_POINT_GROUP, [])  # type: ignore
+
+        for entry_point in group:
+            if entry_point.name in self.sources:
+                logging.warning(f"plugin {entry_point.name} ({entry_point.value}) shadows a bundled plugin, ignoring")
+                continue
+
+            self.sources[entry_point.name] = entry_point.value
+
+    @property
+    def ids(self) -> List[str]:
+        return sorted(self.sources)
+
+    def get(self, plugin_id: str) -> Optional[Dict[str, Any]]:
+        """Get a plugin, import it if this is the first time it is needed."""
+        if plugin_id in self._plugins:
+            return self._plugins[plugin_id]
+
+        if plugin_id in self._failed or plugin_id not in self.sources:
+            return None
+
+        import inspect
+
+        module_name, _, class_name = self.sources[plugin_id].partition(":")
+
+        try:
+            imported_module = importlib.import_module(module_name)
+        except (ModuleNotFoundError, ImportError) as error:
+            # report a broken plugin only once per process
+            logging.error(f"could not load plugin {plugin_id}: {error}")
+            self._failed.add(plugin_id)
+            return None
+
+        if class_name:
+            classes = [getattr(imported_module, class_name)]
+        else:
+            # classes defined in the module itself, not the ones it imports
+            classes = [
+                value
+                for _, value in inspect.getmembers(imported_module, inspect.isclass)
+                if value.__module__ == imported_module.__name__
+            ]
+
+        for value in classes:
+
+            if issubclass(value, MibleDevicePlugin) and value is not MibleDevicePlugin:
+
+                self._plugins[plugin_id] = {
+                    "module": value.__module__,
+                    "class_name": value.__name__,
+                    "class": value,
+                    "config_key": plugin_id,
+                }
+
+                return self._plugins[plugin_id]
+
+        self._failed.add(plugin_id)
+        return None
+
+    def describe(self, plugin_id: str) -> Optional[Tuple[str, str]]:
+        """Get name and description of a plugin, read from its source without importing it if possible."""
+        if plugin_id not in self.sources:
+            return None
+
+        module_name, _, class_name = self.sources[plugin_id].partition(":")
+
+        try:
+            spec = importlib.util.find_spec(module_name)
+        except (ImportError, ValueError):
+            spec = None
+
+        if spec and spec.origin and spec.origin.endswith(".py"):
+            try:
+                with open(spec.origin, "rb") as file:
+                    tree = ast.parse(file.read(), filename=spec.origin)
+            except (OSError, SyntaxError, ValueError):
+                tree = None
+
+            for node in tree.body if tree else []:
+                if not isinstance(node, ast.ClassDef) or (class_name and node.name != class_name):
+                    continue
+
+                attributes = {
+                    target.id: statement.value.value
+                    for statement in node.body
+                    if isinstance(statement, ast.Assign)
+                    and isinstance(statement.value, ast.Constant)
+                    and isinstance(statement.value.value, str)
+                    for target in statement.targets
+                    if isinstance(target, ast.Name)
+                }
+
+                if attributes.get("plugin_id") == plugin_id or (class_name and "plugin_name" in attributes):
+                    return attributes.get("plugin_name", plugin_id), attributes.get("plugin_description", "")
+
+            # bundled modules without a plugin class, e.g. shared helpers
+            if tree and module_name.startswith(f"{BUILTIN_PACKAGE}."):
+                return None
+
+        # built at runtime or not a plain source file
+        if plugin := self.get(plugin_id):
+            return plugin["class"].plugin_name, plugin["class"].plugin_description
+
+        return None
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        """Import and get all available plugins."""
+        return {plugin_id: plugin for plugin_id in self.ids if (plugin := self.get(plugin_id))}
+
+
+_REGISTRY: Optional[PluginRegistry] = None
+
+
+def get_registry() -> PluginRegistry:
+    """Get the plugin registry, built once per process."""
+    global _REGISTRY  # pylint: disable=global-statement
+
+    if _REGISTRY is None:
+        _REGISTRY = PluginRegistry()
+
+    return _REGISTRY
@@ -0,0 +1,359 @@
+"""Record and replay the bluetooth traffic of the plugins.
+
+`record()` wraps the bluepy peripheral and scanner so every connect, characteristic
+read/write, notification and advertisement is appended with its time to a json lines
+capture. `replay()` swaps bluepy for a backend serving a capture back to the
+unmodified plugins, at the recorded pace or as fast as possible.
+
+Both patch the already imported plugin modules, fetches have to run in-process
+(`isolate = false`) to be recorded or replayed.
+"""
+
+import json
+import logging
+import sys
+import threading
+import time
+
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Type
+
+import bluepy.btle as btle
+
+from miblepy import __version__
+
+
+CAPTURE_VERSION = 1
+
+SPEEDS = ("real", "max")
+
+
+def _rebind(name: str, replacement: Type[Any]) -> None:
+    """Replace a bluepy class in bluepy and in every already imported module using it."""
+    original = getattr(btle, name)
+    setattr(btle, name, replacement)
+
+    for module_name, module in list(sys.modules.items()):
+        if not module_name.startswith("miblepy") or module is None:
+            continue
+
+        for attribute, value in list(vars(module).items()):
+            if value is original:
+                setattr(module, attribute, replacement)
+
+
+class Recorder:
+    """Appends bluetooth events to a capture file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.started = time.monotonic()
+
+        self._file = open(path, "a")
+        self._lock = threading.Lock()
+
+        self.write("start", version=CAPTURE_VERSION, miblepy=__version__, time=time.time())
+
+    def write(self, kind: str, **event: Any) -> None:
+        event = {"t": round(time.monotonic() - self.started, 4), "k": kind, **event}
+
+        with self._lock:
+            self._file.write(json.dumps(event, separators=(",", ":")) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class _RecordingDelegate(btle.DefaultDelegate):
+    """Records what bluepy hands to the delegate of a plugin and passes it on."""
+
+    def __init__(self, recorder: Recorder, delegate: Any, address: str = ""):
+        self.recorder = recorder
+        self.delegate = delegate
+        self.address = address
+
+        super().__init__()
+
+    def handleNotification(self, cHandle: int, data: bytes) -> None:
+        self.recorder.write("notify", a=self.address, h=cHandle, v=data.hex())
+        self.delegate.handleNotification(cHandle, data)
+
+    def handleDiscovery(self, scanEntry: Any, isNewDev: bool, isNewData: bool) -> None:
+        self.recorder.write(
+            "scan",
+            a=scanEntry.addr,
+            r=scanEntry.rssi,
+            d=[list(data) for data in scanEntry.getScanData()],
+            n=isNewDev,
+            u=isNewData,
+        )
+        self.delegate.handleDiscovery(scanEntry, isNewDev, isNewData)
+
+
+def record(path: str) -> Recorder:
+    """Record the bluetooth traffic of all plugins to the capture at path."""
+    recorder = Recorder(path)
+    peripheral_class = btle.Peripheral
+    scanner_class = btle.Scanner
+
+    class RecordingPeripheral(peripheral_class):  # type: ignore
+        def __init__(self, deviceAddr: Optional[str] = None, *args: Any, **kwargs: Any):
+            self.address = (deviceAddr or "").lower()
+
+            try:
+                super().__init__(deviceAddr, *args, **kwargs)
+            except btle.BTLEException as error:
+                recorder.write("connect", a=self.address, e=error.__class__.__name__, m=str(error))
+                raise
+
+            recorder.write("connect", a=self.address)
+
+        def setDelegate(self, delegate_: Any) -> Any:
+            return super().setDelegate(_RecordingDelegate(recorder, delegate_, self.address))
+
+        def readCharacteristic(self, handle: int) -> bytes:
+            value: bytes = super().readCharacteristic(handle)
+            recorder.write("read", a=self.address, h=handle, v=value.hex())
+            return value
+
+        def writeCharacteristic(self, handle: int, val: bytes, withResponse: bool = False, **kwargs: Any) -> Any:
+            recorder.write("write", a=self.address, h=handle, v=val.hex())
+            return super().writeCharacteristic(handle, val, withResponse, **kwargs)
+
+        def getCharacteristics(self, *args: Any, **kwargs: Any) -> List[Any]:
+            characteristics = super().getCharacteristics(*args, **kwargs)
+            recorder.write(
+                "characteristics",
+                a=self.address,
+                u=str(kwargs.get("uuid", "")),
+                h=[characteristic.getHandle() for characteristic in characteristics],
+            )
+            return characteristics
+
+        def waitForNotifications(self, timeout: float) -> bool:
+            result: bool = super().waitForNotifications(timeout)
+            recorder.write("wait", a=self.address, r=result)
+            return result
+
+        def disconnect(self) -> None:
+            recorder.write("disconnect", a=self.address)
+            super().disconnect()
+
+    class RecordingScanner(scanner_class):  # type: ignore
+        def withDelegate(self, delegate: Any) -> Any:
+            return super().withDelegate(_RecordingDelegate(recorder, delegate))
+
+        def process(self, timeout: float = 10) -> None:
+            super().process(timeout)
+            recorder.write("process", s=timeout)
+
+    _rebind("Peripheral", RecordingPeripheral)
+    _rebind("Scanner", RecordingScanner)
+
+    return recorder
+
+
+class Capture:
+    """Events of a capture, queued per device in the recorded order."""
+
+    def __init__(self, path: str, speed: str = "max"):
+        if speed not in SPEEDS:
+            raise ValueError(f"speed has to be one of {', '.join(SPEEDS)}")
+
+        self.speed = speed
+        self.devices: Dict[str, Deque[Dict[str, Any]]] = {}
+
+        # advertisements and the end of the scan windows they were received in
+        self.scans: Deque[Dict[str, Any]] = deque()
+
+        # recordings appended to the same capture start their clock at 0 again
+        offset = last = 0.0
+
+        with open(path, "r") as file:
+            for line in file:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    logging.warning(f"skipping broken line in capture {path}: {line!r}")
+                    continue
+
+                if event["k"] == "start":
+                    offset = last
+
+                event["t"] = last = event["t"] + offset
+
+                if event["k"] in ("scan", "process"):
+                    self.scans.append(event)
+                elif event["k"] != "start":
+                    self.devices.setdefault(event["a"], deque()).append(event)
+
+        self._lock = threading.Lock()
+        self._started: Optional[float] = None
+
+    def wait_for(self, event: Dict[str, Any]) -> None:
+        """Keep the recorded pace between the events at real speed."""
+        if self.speed != "real":
+            return
+
+        with self._lock:
+            if self._started is None:
+                self._started = time.monotonic() - event["t"]
+
+        if (delay := self._started + event["t"] - time.monotonic()) > 0:
+            time.sleep(delay)
+
+    def next(self, address: str, kind: str, handle: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Take the next event of a kind (and handle) for a device."""
+        with self._lock:
+            events = self.devices.get(address, deque())
+
+            for event in events:
+                if event["k"] == kind and (handle is None or event.get("h") == handle):
+                    events.remove(event)
+                    break
+            else:
+                return None
+
+        self.wait_for(event)
+        return event
+
+    def notifications(self, address: str) -> List[Dict[str, Any]]:
+        """Take the notifications received before the next wait for them."""
+        with self._lock:
+            events = self.devices.get(address, deque())
+            kinds = [event["k"] for event in events]
+            end = kinds.index("wait") if "wait" in kinds else len(kinds)
+            notifications = [event for event in list(events)[:end] if event["k"] == "notify"]
+
+            for event in notifications:
+                events.remove(event)
+
+        return notifications
+
+
+class ReplayScanEntry:
+    def __init__(self, addr: str, rssi: int, scan_data: List[List[Any]]):
+        self.addr = addr
+        self.rssi = rssi
+        self.scan_data = [tuple(data) for data in scan_data]
+
+    def getScanData(self) -> List[Any]:
+        return self.scan_data
+
+
+def replay(path: str, speed: str = "max") -> Capture:
+    """Serve the capture at path to all plugins instead of the bluetooth adapters."""
+    capture = Capture(path, speed)
+
+    class ReplayCharacteristic:
+        def __init__(self, peripheral: "ReplayPeripheral", handle: int):
+            self.peripheral = peripheral
+            self.valHandle = handle
+
+        def getHandle(self) -> int:
+            return self.valHandle
+
+        def read(self) -> bytes:
+            return self.peripheral.readCharacteristic(self.valHandle)
+
+        def write(self, val: bytes, withResponse: bool = False) -> Any:
+            return self.peripheral.writeCharacteristic(self.valHandle, val, withResponse)
+
+    class ReplayPeripheral:
+        def __init__(self, deviceAddr: Optional[str] = None, *args: Any, **kwargs: Any):
+            self.address = (deviceAddr or "").lower()
+            self.delegate: Any = None
+
+            if not (event := capture.next(self.address, "connect")):
+                raise btle.BTLEDisconnectError(f"no recorded connection to {deviceAddr}")
+
+            if "e" in event:
+                raise getattr(btle, event["e"], btle.BTLEException)(event.get("m", ""))
+
+        def setDelegate(self, delegate_: Any) -> "ReplayPeripheral":
+            self.delegate = delegate_
+            return self
+
+        def withDelegate(self, delegate_: Any) -> "ReplayPeripheral":
+            return self.setDelegate(delegate_)
+
+        def readCharacteristic(self, handle: int) -> bytes:
+            if not (event := capture.next(self.address, "read", handle)):
+                raise btle.BTLEDisconnectError(f"no recorded read of handle {handle:#x} from {self.address}")
+
+            return bytes.fromhex(event["v"])
+
+        def writeCharacteristic(self, handle: int, val: bytes, withResponse: bool = False, **kwargs: Any) -> Any:
+            capture.next(self.address, "write", handle)
+            return {}
+
+        def getCharacteristics(self, *args: Any, **kwargs: Any) -> List[ReplayCharacteristic]:
+            event = capture.next(self.address, "characteristics") or {}
+            return [ReplayCharacteristic(self, handle) for handle in event.get("h", [])]
+
+        def waitForNotifications(self, timeout: float) -> bool:
+            for event in capture.notifications(self.address):
+                capture.wait_for(event)
+
+                if self.delegate:
+                    self.delegate.handleNotification(event["h"], bytes.fromhex(event["v"]))
+
+            result = capture.next(self.address, "wait")
+            return bool(result and result["r"])
+
+        def disconnect(self) -> None:
+            capture.next(self.address, "disconnect")
+
+    class ReplayScanner:
+        def __init__(self, *args: Any, **kwargs: Any):
+            self.delegate: Any = None
+            self.entries: Dict[str, ReplayScanEntry] = {}
+
+        def withDelegate(self, delegate: Any) -> "ReplayScanner":
+            self.delegate = delegate
+            return self
+
+        def clear(self) -> None:
+            self.entries = {}
+
+        def start(self, passive: bool = False) -> None:
+            pass
+
+        def stop(self) -> None:
+            pass
+
+        def process(self, timeout: float = 10) -> None:
+            """Deliver the advertisements of the next recorded scan window."""
+            if not capture.scans:
+                raise btle.BTLEDisconnectError("no more recorded advertisements")
+
+            while capture.scans:
+                event = capture.scans.popleft()
+                capture.wait_for(event)
+
+                if event["k"] == "process":
+                    return
+
+                entry = self.entries.setdefault(event["a"], ReplayScanEntry(event["a"], event["r"], event["d"]))
+                entry.rssi, entry.scan_data = event["r"], [tuple(data) for data in event["d"]]
+
+                if self.delegate:
+                    self.delegate.handleDiscovery(entry, event["n"], event["u"])
+
+        def getDevices(self) -> List[ReplayScanEntry]:
+            return list(self.entries.values())
+
+        def scan(self, timeout: float = 10, passive: bool = False) -> List[ReplayScanEntry]:
+            self.clear()
+            self.start(passive=passive)
+            self.process(timeout)
+            self.stop()
+
+            return self.getDevices()
+
+    _rebind("Peripheral", ReplayPeripheral)
+    _rebind("Scanner", ReplayScanner)
+
+    return capture
@@ -0,0 +1,90 @@
+import logging
+import threading
+import time
+
+from typing import Dict, List, Optional, Set
+
+from bluepy.btle import BTLEDisconnectError, BTLEManagementError, DefaultDelegate, ScanEntry, Scanner
+from miblepy.deviceplugin import MibleAdvertisementPlugin
+
+
+# seconds between the checks if all plugins got what they wait for
+SCAN_SLICE = 0.5
+
+
+class AdvertisementScanner(DefaultDelegate):
+    """Listens once and routes every advertisement to the plugins of the sending device."""
+
+    def __init__(self, interface: str):
+        self.interface = interface
+
+        # lowercase mac -> plugins listening to this device
+        self.listeners: Dict[str, List[MibleAdvertisementPlugin]] = {}
+
+        # lowercase macs of devices we only want the signal strength of
+        self.watched: Set[str] = set()
+
+        # lowercase mac -> signal strength the device was last heard with
+        self.rssi: Dict[str, int] = {}
+
+        # set to close the scan window, e.g. when the scan of another adapter ended
+        self.finished = threading.Event()
+
+        super().__init__()
+
+    def add(self, plugin: MibleAdvertisementPlugin) -> None:
+        self.listeners.setdefault(plugin.mac.lower(), []).append(plugin)
+
+    def watch(self, mac: str) -> None:
+        """Record the signal strength of a device without a plugin listening to it."""
+        self.watched.add(mac.lower())
+
+    @property
+    def plugins(self) -> List[MibleAdvertisementPlugin]:
+        return [plugin for plugins in self.listeners.values() for plugin in plugins]
+
+    @property
+    def timeout(self) -> float:
+        """Scan window needed to serve all listening plugins."""
+        return max((plugin.scan_timeout for plugin in self.plugins), default=0)
+
+    @property
+    def done(self) -> bool:
+        # a scan only watching devices runs until its timeout
+        return self.finished.is_set() or (bool(self.plugins) and all(plugin.done for plugin in self.plugins))
+
+    def scan(self, timeout: Optional[float] = None) -> None:
+        """Open a single scan window for all listening plugins, closed early once all of them are done."""
+        if not self.listeners and not self.watched:
+            return
+
+        scanner = Scanner(iface=int(self.interface.replace("hci", ""))).withDelegate(self)
+        deadline = time.monotonic() + (timeout or self.timeout)
+
+        try:
+            scanner.clear()
+            scanner.start()
+
+            try:
+                while not self.done and (remaining := deadline - time.monotonic()) > 0:
+                    scanner.process(min(remaining, SCAN_SLICE))
+            finally:
+                scanner.stop()
+
+        except BTLEDisconnectError as error:
+            logging.error(f"btle disconnected: {error}")
+        except BTLEManagementError as error:
+            logging.error(f"(temporary) bluetooth connection error: {error}")
+
+    def handleDiscovery(self, dev: ScanEntry, new_dev: bool, new_data: bool) -> None:
+        if dev.addr not in self.listeners and dev.addr not in self.watched:
+            return
+
+        self.rssi[dev.addr] = dev.rssi
+
+        for plugin in self.listeners.get(dev.addr, []):
+            try:
+                with plugin.phase("decode"):
+                    plugin.handle_advertisement(dev, new_dev, new_data)
+            except Exception as error:  # pylint: disable=broad-except
+                logging.error(f"· {plugin.alias}: could not decode advertisement: {error}")
@@ -0,0 +1,138 @@
+import logging
+import threading
+import time
+
+from heapq import heappop, heappush
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set, Tuple
+
+
+if TYPE_CHECKING:
+    from miblepy import DeviceConfig
+
+
+# (due time, position, sensor, attempt)
+Job = Tuple[float, int, "DeviceConfig", int]
+
+
+class AdapterScheduler:
+    """Fetches sensors in parallel with one worker per bluetooth adapter.
+
+    Workers pull the next due sensor from a shared deadline-ordered queue, sensors
+    pinned to an adapter are only fetched by the worker of this adapter. Sensors
+    `route` picks an adapter for are tried on this one first. A failed sensor goes
+    back into the queue with its own exponential backoff while the workers keep
+    fetching the other sensors.
+    """
+
+    def __init__(
+        self,
+        interfaces: List[str],
+        fetch: Callable[["DeviceConfig", str], bool],
+        max_attempts: Callable[["DeviceConfig"], int],
+        backoff: float = 1,
+        route: Optional[Callable[["DeviceConfig"], Optional[str]]] = None,
+    ):
+        self.interfaces = interfaces
+        self.fetch = fetch
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.route = route
+
+        self.shared: List[Job] = []
+        self.pinned: Dict[str, List[Job]] = {interface: [] for interface in interfaces}
+
+        self.failed: Set["DeviceConfig"] = set()
+        self.attempts: Dict["DeviceConfig", int] = {}
+
+        # number of sensors currently being fetched, they may come back into the queue
+        self._active = 0
+        self._position = 0
+        self._condition = threading.Condition()
+
+    def _lane(self, sensor: "DeviceConfig", attempt: int) -> List[Job]:
+        if sensor.interface in self.pinned:
+            return self.pinned[sensor.interface]
+
+        if sensor.interface:
+            logging.warning(f"· {sensor.name}: unknown interface {sensor.interface}, using any")
+
+        # the routed adapter gets the first try, retries go to whichever adapter is free
+        elif attempt == 1 and self.route and (interface := self.route(sensor)) in self.pinned:
+            return self.pinned[interface]
+
+        return self.shared
+
+    def _schedule(self, sensor: "DeviceConfig", attempt: int, due: float) -> None:
+        self._position += 1
+        heappush(self._lane(sensor, attempt), (due, self._position, sensor, attempt))
+
+    def _next(self, interface: str) -> Optional[Tuple["DeviceConfig", int]]:
+        """Wait for the next sensor due on an adapter, pinned ones first."""
+        with self._condition:
+            while True:
+                wait: Optional[float] = None
+
+                if lanes := [lane for lane in (self.pinned[interface], self.shared) if lane]:
+                    lane = min(lanes, key=lambda queued: queued[0][0])
+
+                    if (wait := lane[0][0] - time.monotonic()) <= 0:
+                        _, _, sensor, attempt = heappop(lane)
+                        self._active += 1
+                        return sensor, attempt
+
+                elif not self._active:
+                    # nothing queued and nothing in progress which could be retried
+                    return None
+
+                self._condition.wait(wait)
+
+    def _done(self, sensor: "DeviceConfig", attempt: int, success: bool) -> None:
+        with self._condition:
+            self._active -= 1
+            self.attempts[sensor] = attempt
+
+            if not success:
+                if attempt < self.max_attempts(sensor):
+                    delay = self.backoff * 2 ** (attempt - 1)
+                    logging.info(f"try {attempt + 1}/{self.max_attempts(sensor)} for {sensor.name} in {delay}s")
+                    self._schedule(sensor, attempt + 1, time.monotonic() + delay)
+                else:
+                    self.failed.add(sensor)
+
+            self._condition.notify_all()
+
+    def _worker(self, interface: str) -> None:
+        while job := self._next(interface):
+            sensor, attempt = job
+            success = False
+
+            try:
+                success = self.fetch(sensor, interface)
+            finally:
+                self._done(sensor, attempt, success)
+
+    def run(self, sensors: List["DeviceConfig"]) -> Set["DeviceConfig"]:
+        """Fetch all sensors in the given order and return the ones that failed every attempt."""
+        now = time.monotonic()
+
+        with self._condition:
+            for sensor in sensors:
+                self._schedule(sensor, 1, now)
+
+        # a single adapter does not need a thread
+        if len(self.interfaces) == 1:
+            self._worker(self.interfaces[0])
+            return self.failed
+
+        workers = [
+            threading.Thread(target=self._worker, args=(interface,), name=f"miblepy-{interface}", daemon=True)
+            for interface in self.interfaces
+        ]
+
+        for worker in workers:
+            worker.start()
+
+        for worker in workers:
+            worker.join()
+
+        return self.failed
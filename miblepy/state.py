@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import threading
+
+from typing import Any, Dict, Iterator, Optional
+
+
+STATE_DIR = "~/.cache/miblepy"
+
+
+class JsonStore:
+    """Small json file to keep state between runs."""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.data: Dict[str, Any] = self._load()
+        self.dirty = False
+
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as error:
+            logging.warning(f"could not load state from {self.path}, starting empty: {error}")
+            return {}
+
+        return data if isinstance(data, dict) else {}
+
+    def get(self, key: str, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            return self.data.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self.data[key] = value
+            self.dirty = True
+
+    def pop(self, key: str) -> Any:
+        with self._lock:
+            if key not in self.data:
+                return None
+
+            self.dirty = True
+            return self.data.pop(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.data
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.data))
+
+    def save(self) -> None:
+        """Write the state to disk if it changed."""
+        with self._lock:
+            if not self.dirty:
+                return
+
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+                # write to a temporary file first to never leave a half-written state behind
+                with open(f"{self.path}.tmp", "w") as file:
+                    json.dump(self.data, file, separators=(",", ":"))
+                os.replace(f"{self.path}.tmp", self.path)
+
+                self.dirty = False
+            except OSError as error:
+                logging.warning(f"could not save state to {self.path}: {error}")
+
+
+class Journal:
+    """Append-only json lines file of records, the latest record per key is kept in memory."""
+
+    def __init__(self, path: str, key: str):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.key = key
+        self.records: Dict[str, Dict[str, Any]] = self._load()
+
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        records: Dict[str, Dict[str, Any]] = {}
+
+        try:
+            with open(self.path, "r") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # e.g. a line cut short by a crash
+                        continue
+
+                    if isinstance(record, dict) and self.key in record:
+                        records[str(record[self.key])] = record
+        except FileNotFoundError:
+            pass
+        except OSError as error:
+            logging.warning(f"could not load journal {self.path}, starting empty: {error}")
+
+        return records
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self.records.get(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.records
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Add a record and write it to disk right away."""
+        with self._lock:
+            self.records[str(record[self.key])] = record
+
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+                with open(self.path, "a") as file:
+                    file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            except OSError as error:
+                logging.warning(f"could not write to journal {self.path}: {error}")
@@ -0,0 +1,111 @@
+import time
+
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+from miblepy.state import JsonStore
+
+
+if TYPE_CHECKING:
+    from miblepy import DeviceConfig
+
+
+# weight of the latest fetch in the moving average latency
+LATENCY_WEIGHT = 0.3
+
+# latency assumed for sensors we know nothing about yet
+DEFAULT_LATENCY = 10.0
+
+# weight of the latest reading in the moving average signal strength per adapter
+RSSI_WEIGHT = 0.3
+
+# seconds until a signal strength reading is too old to route by
+RSSI_MAX_AGE = 60 * 60
+
+
+class SensorStats:
+    """Fetch statistics per sensor mac, kept between runs."""
+
+    def __init__(self, path: str):
+        self.store = JsonStore(path)
+
+    def get(self, mac: str) -> Dict[str, Any]:
+        return dict(self.store.get(mac, {}))
+
+    def success(self, mac: str, latency: float) -> None:
+        """Record a successful fetch which took `latency` seconds."""
+        stats = self.get(mac)
+
+        if (average := stats.get("latency")) is not None:
+            latency = LATENCY_WEIGHT * latency + (1 - LATENCY_WEIGHT) * average
+
+        stats.update({"last_success": time.time(), "latency": round(latency, 3), "failure_streak": 0})
+        self.store.set(mac, stats)
+
+    def failure(self, mac: str) -> None:
+        """Record a failed fetch."""
+        stats = self.get(mac)
+        stats.update({"last_failure": time.time(), "failure_streak": stats.get("failure_streak", 0) + 1})
+        self.store.set(mac, stats)
+
+    def rssi(self, mac: str, rssi: int, interface: str) -> None:
+        """Record the signal strength a sensor was seen with by an adapter."""
+        stats = self.get(mac)
+        adapters = dict(stats.get("adapters", {}))
+
+        average = float(rssi)
+        if (reading := adapters.get(interface)) and time.time() - reading["time"] < RSSI_MAX_AGE:
+            average = RSSI_WEIGHT * rssi + (1 - RSSI_WEIGHT) * reading["rssi"]
+
+        adapters[interface] = {"rssi": round(average, 1), "time": time.time()}
+        stats.update({"rssi": rssi, "adapters": adapters})
+        self.store.set(mac, stats)
+
+    def signal(self, mac: str, interfaces: Iterable[str]) -> Dict[str, float]:
+        """Recent average signal strength of a sensor by adapter."""
+        now = time.time()
+
+        return {
+            interface: reading["rssi"]
+            for interface, reading in self.get(mac).get("adapters", {}).items()
+            if interface in interfaces and now - reading["time"] < RSSI_MAX_AGE
+        }
+
+    def adapter(self, mac: str, interfaces: List[str], hysteresis: float) -> Optional[str]:
+        """Adapter hearing a sensor best, the current one is kept unless another one is `hysteresis` dB better."""
+        if not (signal := self.signal(mac, interfaces)):
+            return None
+
+        stats = self.get(mac)
+        best = max(signal, key=lambda interface: signal[interface])
+
+        if (current := stats.get("adapter")) in signal and signal[best] - signal[current] < hysteresis:
+            return str(current)
+
+        if current != best:
+            stats["adapter"] = best
+            self.store.set(mac, stats)
+
+        return best
+
+    def parked_until(self, mac: str, threshold: int, cooloff: float) -> float:
+        """Time until a repeatedly failing sensor is parked by the circuit breaker, 0 if it is not."""
+        stats = self.get(mac)
+
+        if not threshold or stats.get("failure_streak", 0) < threshold:
+            return 0
+
+        return float(stats.get("last_failure", 0)) + cooloff
+
+    def _rank(self, sensor: "DeviceConfig") -> Tuple[int, float]:
+        stats = self.get(sensor.mac)
+        latency: Optional[float] = stats.get("latency")
+
+        # reliable sensors by latency, then the ones failing by how often they failed in a row
+        return (stats.get("failure_streak", 0), latency if latency is not None else DEFAULT_LATENCY)
+
+    def order(self, sensors: Iterable["DeviceConfig"]) -> List["DeviceConfig"]:
+        """Order sensors so reliable and fast ones are fetched first and chronic failures last."""
+        return sorted(sensors, key=self._rank)
+
+    def save(self) -> None:
+        self.store.save()
@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set, Tuple
+
+from miblepy import metrics
+from miblepy.deviceplugin import MibleDevicePlugin, MibleStreamingPlugin
+
+
+if TYPE_CHECKING:
+    from miblepy import DeviceConfig
+
+
+# seconds a stream waits for notifications before checking if it should stop
+LISTEN_TIMEOUT = 1
+
+# upper bound of the reconnect backoff in seconds
+MAX_BACKOFF = 300
+
+
+class NotificationStreamer:
+    """Keeps the connections to streaming sensors open and publishes every notification.
+
+    Every streamed sensor gets a thread which connects, listens and hands each
+    measurement to `publish` as it arrives. At most `max_streams` connections are
+    kept open per adapter. A dropped or silent connection is reopened with
+    exponential backoff.
+    """
+
+    def __init__(
+        self,
+        interfaces: List[str],
+        get_plugin: Callable[["DeviceConfig", str], Optional[MibleDevicePlugin]],
+        publish: Callable[["DeviceConfig", MibleDevicePlugin, Dict[str, Any]], Any],
+        max_streams: int,
+        backoff: float = 1,
+    ):
+        self.interfaces = interfaces
+        self.get_plugin = get_plugin
+        self.publish = publish
+        self.max_streams = max_streams
+        self.backoff = backoff
+
+        # sensor -> (thread, stop event, interface)
+        self.streams: Dict["DeviceConfig", Tuple[threading.Thread, threading.Event, str]] = {}
+
+    def _interface(self, sensor: "DeviceConfig") -> Optional[str]:
+        """Adapter with a free stream slot, the pinned one or the least busy one."""
+        load = {interface: 0 for interface in self.interfaces}
+        for _, _, interface in self.streams.values():
+            load[interface] = load.get(interface, 0) + 1
+
+        candidates = [sensor.interface] if sensor.interface in load else self.interfaces
+        free = [interface for interface in candidates if load[interface] < self.max_streams]
+
+        return min(free, key=lambda interface: load[interface]) if free else None
+
+    def sync(self, sensors: List["DeviceConfig"]) -> Set["DeviceConfig"]:
+        """Stream the given sensors, stop all other streams and return the sensors which are streamed.
+
+        Sensors without a free slot are left out, the first ones in the list are streamed.
+        """
+        wanted = set(sensors)
+        wanted_macs = {sensor.mac for sensor in sensors}
+        restarted: List[threading.Thread] = []
+
+        for sensor, (thread, _, streaming_on) in list(self.streams.items()):
+            if sensor not in wanted or streaming_on not in self.interfaces:
+                self.stop(sensor)
+
+                # e.g. a changed config of the sensor, streamed again once the old connection is closed
+                if sensor.mac in wanted_macs:
+                    restarted.append(thread)
+
+        # a stream listens for LISTEN_TIMEOUT before it sees the stop, then disconnects
+        deadline = time.monotonic() + LISTEN_TIMEOUT * 2
+        for thread in restarted:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+        for sensor in sensors:
+            if sensor in self.streams:
+                continue
+
+            if not (interface := self._interface(sensor)):
+                logging.warning(
+                    f"· {sensor.name}: all {self.max_streams} stream slots per adapter are taken, polling it instead"
+                )
+                continue
+
+            stop = threading.Event()
+            thread = threading.Thread(
+                target=self._stream, args=(sensor, interface, stop), name=f"miblepy-stream-{sensor.name}", daemon=True
+            )
+            self.streams[sensor] = (thread, stop, interface)
+            thread.start()
+
+        return set(self.streams)
+
+    def stop(self, sensor: "DeviceConfig") -> None:
+        """Close the stream of a sensor, its thread disconnects on its own."""
+        if stream := self.streams.pop(sensor, None):
+            stream[1].set()
+
+    def stop_all(self, timeout: float = LISTEN_TIMEOUT * 5) -> None:
+        """Close all streams and wait a bit for the connections to be closed."""
+        threads = [thread for thread, _, _ in self.streams.values()]
+
+        for sensor in list(self.streams):
+            self.stop(sensor)
+
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+    def _stream(self, sensor: "DeviceConfig", interface: str, stop: threading.Event) -> None:
+        backoff = self.backoff
+
+        while not stop.is_set():
+            plugin = self.get_plugin(sensor, interface)
+
+            if not isinstance(plugin, MibleStreamingPlugin):
+                logging.error(f"· {sensor.name}: plugin {sensor.device_type} does not support streaming")
+                return
+
+            try:
+                plugin.subscribe()
+                logging.info(f"· {sensor.name}: streaming notifications via {interface}")
+
+                heard = time.monotonic()
+
+                while not stop.is_set():
+                    if data := plugin.listen(LISTEN_TIMEOUT):
+                        heard = time.monotonic()
+                        backoff = self.backoff
+
+                        metrics.NOTIFICATIONS.inc(sensor=sensor.name)
+                        self.publish(sensor, plugin, data)
+
+                    elif time.monotonic() - heard > plugin.stream_timeout:
+                        raise TimeoutError(f"no notification for {plugin.stream_timeout}s")
+
+            except Exception as error:  # pylint: disable=broad-except
+                if stop.is_set():
+                    break
+
+                logging.info(
+                    f"· {sensor.name}: stream lost ({error or error.__class__.__name__}), reconnecting in {backoff}s"
+                )
+                metrics.RECONNECTS.inc(sensor=sensor.name)
+
+            finally:
+                try:
+                    plugin.close()
+                except Exception as error:  # pylint: disable=broad-except
+                    logging.debug(f"· {sensor.name}: could not close the stream: {error}")
+
+            stop.wait(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
@@ -0,0 +1,105 @@
+import logging
+import multiprocessing
+import pickle  # nosec
+
+from multiprocessing.connection import Connection
+from typing import Any, Dict, Optional, Tuple, Type
+
+from miblepy.deviceplugin import MibleDevicePlugin
+
+
+class FetchTimeout(Exception):
+    """The plugin did not return within its deadline."""
+
+
+class FetchError(Exception):
+    """The plugin raised an exception which could not be sent back from the worker."""
+
+
+def _serve(connection: Connection, loglevel: int) -> None:
+    """Run plugin fetches for the supervisor until the pipe is closed."""
+    logging.basicConfig(level=loglevel, format="{asctime} {levelname} {message}", style="{")
+
+    while True:
+        try:
+            plugin_class, mac, interface, config = connection.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+
+        try:
+            plugin: MibleDevicePlugin = plugin_class(mac, interface, **config)
+            connection.send((True, (plugin.fetch_data(**config), plugin.timings)))
+
+        except Exception as error:  # pylint: disable=broad-except
+
+            # not every exception survives the trip through the pipe (bluepy ones do not)
+            try:
+                pickle.loads(pickle.dumps(error))  # nosec
+            except Exception:  # pylint: disable=broad-except
+                error = FetchError(f"{error.__class__.__name__}: {error}")
+
+            connection.send((False, error))
+
+
+class FetchWorker:
+    """Runs plugin fetches in a supervised process which is killed and replaced if it hangs."""
+
+    def __init__(self, loglevel: int = logging.WARNING):
+        self.loglevel = loglevel
+
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+        self.connection: Optional[Connection] = None
+
+    def _start(self) -> Connection:
+        if self.process and self.process.is_alive() and self.connection:
+            return self.connection
+
+        # spawn instead of fork, the parent runs the mqtt network and adapter threads
+        context = multiprocessing.get_context("spawn")
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_serve, args=(child_connection, self.loglevel), name="miblepy-fetch", daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+
+        return self.connection
+
+    def fetch(
+        self, plugin_class: Type[MibleDevicePlugin], mac: str, interface: str, config: Dict[str, Any], timeout: float,
+    ) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """Fetch data and phase timings with a plugin, raises FetchTimeout if it did not return in time."""
+        connection = self._start()
+        connection.send((plugin_class, mac, interface, config))
+
+        if not connection.poll(timeout):
+            self.stop()
+            raise FetchTimeout(f"no data within {timeout}s")
+
+        try:
+            success, result = connection.recv()
+        except EOFError:
+            # worker died, e.g. by a crash in the bluetooth stack
+            self.stop()
+            raise FetchError("fetch worker exited unexpectedly")
+
+        if not success:
+            raise result
+
+        return result
+
+    def stop(self) -> None:
+        """Stop (and kill if needed) the worker process."""
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+        if self.process:
+            self.process.terminate()
+            self.process.join(1)
+
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+
+            self.process = None
@@ -52,10 +52,14 @@ setup(
         'tomlkit==0.*,>=0.6.0'
     ],
     extras_require={
+        "batch": ["numpy==1.*,>=1.19.0"],
+        "cbor": ["cbor2==5.*,>=5.2.0"],
         "dev": [
             "bandit==1.*,>=1.6.2", "black==19.*,>=19.10.0.b0",
             "flake8==3.*,>=3.8.1", "isort==4.*,>=4.3.21", "mypy==0.*,>=0.770.0",
             "pycodestyle==2.*,>=2.6.0", "pytest==5.*,>=5.2.0"
-        ]
+        ],
+        "mibeacon": ["cryptography==3.*,>=3.1.0"],
+        "msgpack": ["msgpack==1.*,>=1.0.0"]
     },
 )